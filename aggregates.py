@@ -0,0 +1,205 @@
+import os
+import threading
+
+import numpy as np
+
+import dataset
+from dataset import CATEGORICAL_COLUMNS, TARGET_COLUMN
+
+# Bumped whenever the binning below changes so that stale cache files are not picked up
+AGGREGATES_VERSION = 1
+
+PRICE_BINS = 100
+# Log-spaced bins keep price quantiles within ~1% for cheap and expensive stones alike
+QUANTILE_BINS = 400
+CARAT_BINS = 60
+DENSITY_PRICE_BINS = 60
+
+CORRELATION_COLUMNS = ['carat', 'cut', 'color', 'clarity', 'depth', 'table', 'price', 'x', 'y', 'z']
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+def bin_index(values, edges):
+    # Right-closed last bin like np.histogram, so the maximum lands in the last bin
+    return np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+
+
+def cell_bincount(cells, n_cells, bins=None, n_bins=1, weights=None):
+    index = cells if bins is None else cells * n_bins + bins
+    counts = np.bincount(index, weights=weights, minlength=n_cells * n_bins)
+    if weights is None:
+        counts = counts.astype(np.int32)
+    return counts.reshape(n_cells, n_bins) if bins is not None else counts
+
+
+class DatasetAggregates:
+    # Binned statistics per (cut, color, clarity) cell. Every chart of the visualization page is
+    # derived by summing the cells selected by the filters, so filtering never touches raw rows.
+    def __init__(self, shape, arrays, digest):
+        self.shape = tuple(shape)
+        self.digest = digest
+        self.counts = arrays['counts']
+        self.price_edges = arrays['price_edges']
+        self.price_hist = arrays['price_hist']
+        self.quantile_edges = arrays['quantile_edges']
+        self.quantile_hist = arrays['quantile_hist']
+        self.carat_edges = arrays['carat_edges']
+        self.density_price_edges = arrays['density_price_edges']
+        self.price_carat = arrays['price_carat']
+        self.shift = arrays['shift']
+        self.sums = arrays['sums']
+        self.cross = arrays['cross']
+
+    def to_arrays(self):
+        return {
+            'counts': self.counts,
+            'price_edges': self.price_edges,
+            'price_hist': self.price_hist,
+            'quantile_edges': self.quantile_edges,
+            'quantile_hist': self.quantile_hist,
+            'carat_edges': self.carat_edges,
+            'density_price_edges': self.density_price_edges,
+            'price_carat': self.price_carat,
+            'shift': self.shift,
+            'sums': self.sums,
+            'cross': self.cross,
+        }
+
+    def codes(self, column):
+        return list(range(self.shape[CATEGORICAL_COLUMNS.index(column)]))
+
+    def cell_mask(self, cut=None, color=None, clarity=None):
+        # None means "no filter" for that column; the mask is over the flattened cell grid
+        selected = [np.zeros(size, dtype=bool) for size in self.shape]
+        for axis, codes in enumerate((cut, color, clarity)):
+            if codes is None:
+                selected[axis][:] = True
+            else:
+                selected[axis][[code for code in codes if 0 <= code < self.shape[axis]]] = True
+        cut_axis, color_axis, clarity_axis = selected
+        return (cut_axis[:, None, None] & color_axis[None, :, None] & clarity_axis[None, None, :]).reshape(-1)
+
+    def count(self, mask):
+        return int(self.counts[mask].sum())
+
+    def price_histogram(self, mask):
+        return self.price_edges, self.price_hist[mask].sum(axis=0)
+
+    def price_vs_carat(self, mask):
+        return self.carat_edges, self.density_price_edges, self.price_carat[mask].sum(axis=0)
+
+    def category_counts(self, mask, rows, columns):
+        # Cell counts summed over every categorical column except `rows` and `columns`
+        grid = np.where(mask, self.counts, 0).reshape(self.shape)
+        keep = (CATEGORICAL_COLUMNS.index(rows), CATEGORICAL_COLUMNS.index(columns))
+        other = tuple(axis for axis in range(len(self.shape)) if axis not in keep)
+        summed = grid.sum(axis=other)
+        return summed if keep[0] < keep[1] else summed.T
+
+    def price_quantiles(self, mask, column, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        # Per-category price quantiles, interpolated linearly inside the log-spaced bins
+        axis = CATEGORICAL_COLUMNS.index(column)
+        hist = np.where(mask[:, None], self.quantile_hist, 0).reshape(self.shape + (-1,))
+        other = tuple(a for a in range(len(self.shape)) if a != axis)
+        per_category = hist.sum(axis=other)
+        result = {}
+        for code, counts in enumerate(per_category):
+            total = counts.sum()
+            if total == 0:
+                continue
+            cumulative = np.concatenate([[0], np.cumsum(counts)])
+            result[code] = np.interp(np.asarray(quantiles) * total, cumulative, self.quantile_edges)
+        return result
+
+    def correlation(self, mask):
+        n = self.counts[mask].sum()
+        if n < 2:
+            return np.full((len(CORRELATION_COLUMNS),) * 2, np.nan)
+        sums = self.sums[mask].sum(axis=0)
+        cross = self.cross[mask].sum(axis=0)
+        cov = (cross - np.outer(sums, sums) / n) / (n - 1)
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(std, std)
+        # Columns that are constant inside the selection (e.g. a filtered category) have no correlation
+        corr[std == 0, :] = np.nan
+        corr[:, std == 0] = np.nan
+        return np.clip(corr, -1.0, 1.0)
+
+
+def compute_aggregates(diamonds):
+    columns = diamonds.columns
+    shape = tuple(int(columns[col].max()) + 1 for col in CATEGORICAL_COLUMNS)
+    n_cells = int(np.prod(shape))
+    cells = np.ravel_multi_index(tuple(columns[col].astype(np.intp) for col in CATEGORICAL_COLUMNS), shape)
+
+    price = columns[TARGET_COLUMN].astype(np.float64)
+    carat = columns['carat'].astype(np.float64)
+    price_edges = np.linspace(price.min(), price.max(), PRICE_BINS + 1)
+    quantile_edges = np.geomspace(max(price.min(), 1.0), price.max(), QUANTILE_BINS + 1)
+    carat_edges = np.linspace(carat.min(), carat.max(), CARAT_BINS + 1)
+    density_price_edges = np.linspace(price.min(), price.max(), DENSITY_PRICE_BINS + 1)
+
+    density_bins = bin_index(carat, carat_edges) * DENSITY_PRICE_BINS + bin_index(price, density_price_edges)
+    price_carat = cell_bincount(cells, n_cells, density_bins, CARAT_BINS * DENSITY_PRICE_BINS)
+
+    # Sufficient statistics for the correlation matrix, accumulated around the global mean so
+    # that the per-cell sums of products stay well conditioned
+    values = np.column_stack([columns[col] for col in CORRELATION_COLUMNS]).astype(np.float64)
+    shift = values.mean(axis=0)
+    values -= shift
+    k = len(CORRELATION_COLUMNS)
+    sums = np.column_stack([cell_bincount(cells, n_cells, weights=values[:, i]) for i in range(k)])
+    cross = np.empty((n_cells, k, k))
+    for i in range(k):
+        for j in range(i, k):
+            cross[:, i, j] = cross[:, j, i] = cell_bincount(cells, n_cells, weights=values[:, i] * values[:, j])
+
+    arrays = {
+        'counts': cell_bincount(cells, n_cells),
+        'price_edges': price_edges,
+        'price_hist': cell_bincount(cells, n_cells, bin_index(price, price_edges), PRICE_BINS),
+        'quantile_edges': quantile_edges,
+        'quantile_hist': cell_bincount(cells, n_cells, bin_index(price, quantile_edges), QUANTILE_BINS),
+        'carat_edges': carat_edges,
+        'density_price_edges': density_price_edges,
+        'price_carat': price_carat.reshape(n_cells, CARAT_BINS, DENSITY_PRICE_BINS),
+        'shift': shift,
+        'sums': sums,
+        'cross': cross,
+    }
+    return DatasetAggregates(shape, arrays, diamonds.digest)
+
+
+def aggregates_cache_path(digest):
+    return dataset.cache_path(f"aggregates-v{AGGREGATES_VERSION}", digest)
+
+
+def build_aggregates(diamonds):
+    cached = aggregates_cache_path(diamonds.digest)
+    if os.path.exists(cached):
+        try:
+            arrays, meta = dataset.read_cache(cached)
+            return DatasetAggregates(meta['shape'], arrays, diamonds.digest)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    aggregates = compute_aggregates(diamonds)
+    try:
+        dataset.write_cache(cached, aggregates.to_arrays(), {'shape': list(aggregates.shape)})
+    except OSError:
+        pass
+    return aggregates
+
+
+def load_aggregates(path=dataset.DATASET_PATH):
+    # Keyed on the dataset content hash: a refreshed CSV gets new aggregates, reruns reuse them
+    diamonds = dataset.load_dataset(path)
+    with _lock:
+        aggregates = _loaded.get(path)
+        if aggregates is None or aggregates.digest != diamonds.digest:
+            aggregates = build_aggregates(diamonds)
+            _loaded[path] = aggregates
+        return aggregates
@@ -12,6 +12,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Creates the shared pool; models listed in DIAMONDS_PRELOAD_MODELS start loading in the background
+page_prediction.get_model_pool()
+
 def show_developer_info_page():
     st.title("Информация о разработчике")
 
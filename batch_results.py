@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import tracing
+from batch_score import open_writer
+
+# Rows scored per call: bounds the preprocessed matrix and the prediction cache keys held at once
+SCORE_CHUNK_ROWS = 20_000
+EXPORT_CHUNK_ROWS = 50_000
+PREVIEW_ROWS = 1_000
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def score_valid_rows(validation, score, chunk_rows=SCORE_CHUNK_ROWS):
+    # Returns one prediction per input row, NaN for the rows that failed validation
+    predictions = np.full(len(validation.frame), np.nan)
+    positions = np.flatnonzero(validation.valid)
+    features = validation.valid_frame()
+    for start in range(0, len(features), chunk_rows):
+        stop = start + chunk_rows
+        predictions[positions[start:stop]] = score(features.iloc[start:stop])
+    return predictions
+
+
+def frame_for_valid_rows(validation, build, predictions, chunk_rows=SCORE_CHUNK_ROWS):
+    # Same chunking for outputs with several columns; build also gets the chunk's already computed
+    # predictions (one per input row, as returned by score_valid_rows). Invalid rows come back as NaN.
+    positions = np.flatnonzero(validation.valid)
+    features = validation.valid_frame()
+    parts = [build(features.iloc[start:start + chunk_rows], predictions[positions[start:start + chunk_rows]])
+             for start in range(0, len(features), chunk_rows)]
+    return pd.concat(parts).reindex(validation.frame.index)
+
+
+def write_result(df, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    writer = open_writer(path)
+    try:
+        for start in range(0, len(df), chunk_rows):
+            writer.write(df.iloc[start:start + chunk_rows])
+    finally:
+        writer.close()
+
+
+def export_bytes(df, file_format, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Only one chunk is ever rendered as text, but the finished file still ends up in memory: Streamlit keeps
+    # download data as bytes in its media storage and cannot serve it from disk. batch_score.py has no such limit.
+    with tracing.span("serialize", file_format, len(df)), tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, f"result.{file_format}")
+        write_result(df, path, chunk_rows)
+        with open(path, 'rb') as f:
+            return f.read()
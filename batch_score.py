@@ -0,0 +1,221 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import model_registry
+import native_runtime
+from explain import Explainer
+from fast_preprocess import backend_dtype, compile_preprocessor
+from dataset import CATEGORICAL_COLUMNS
+from model_registry import FEATURE_COLUMNS, MODEL_FILES
+from scoring_engine import ScoringEngine
+import schema
+import tracing
+
+DEFAULT_CHUNK_SIZE = 50_000
+PREDICTION_COLUMN = 'predicted_price'
+
+
+def is_parquet(path):
+    return path.lower().endswith(('.parquet', '.pq'))
+
+
+def iter_input_chunks(path, chunk_size):
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+class CsvChunkWriter:
+    def __init__(self, path):
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._header = True
+
+    def write(self, chunk):
+        chunk.to_csv(self._file, index=False, header=self._header)
+        self._header = False
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetChunkWriter:
+    def __init__(self, path, compression='snappy'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._pq = pq
+        self._path = path
+        self._compression = compression
+        self._writer = None
+        self._schema = None
+
+    def _file_schema(self, table):
+        # Columns that are empty in the first chunk have no real type yet; text is the one type any later value fits
+        pa = self._pa
+        fields = [field.with_type(pa.string()) if column.null_count == len(column) else field
+                  for field, column in zip(table.schema, table.columns)]
+        return pa.schema(fields, metadata=table.schema.metadata)
+
+    def write(self, chunk):
+        table = self._pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            self._schema = self._file_schema(table)
+            self._writer = self._pq.ParquetWriter(self._path, self._schema, compression=self._compression)
+        # Chunks are parsed separately, so the same column may come back as int64, float64 or null
+        try:
+            table = table.cast(self._schema)
+        except (self._pa.ArrowInvalid, self._pa.ArrowNotImplementedError) as e:
+            columns = [field.name for field in table.schema if field.type != self._schema.field(field.name).type]
+            raise ValueError(f"Тип колонок {', '.join(columns)} отличается от первого чанка ({e}); "
+                             f"запишите результат в CSV или увеличьте --chunk-size") from e
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_writer(path):
+    if is_parquet(path):
+        return ParquetChunkWriter(path)
+    return CsvChunkWriter(path)
+
+
+def resolve_model_filename(model_name):
+    if model_name in MODEL_FILES:
+        return MODEL_FILES[model_name]
+    if model_name in MODEL_FILES.values():
+        return model_name
+    raise ValueError(
+        f"Неизвестная модель: {model_name}. Доступные: {', '.join(MODEL_FILES.values())}"
+    )
+
+
+def score_chunk(engine, chunk, explainer=None, coerce_features=False):
+    # Rows with bad values are left unscored (NaN price) instead of failing the whole chunk
+    with tracing.span("validate", engine.model_filename, len(chunk)):
+        validation = schema.validate(chunk)
+    if coerce_features:
+        # Parquet keeps one type per column for the whole file, so features are written as validated
+        # numbers and category codes; unparsable values become empty instead of changing the column type
+        for col in FEATURE_COLUMNS:
+            values = validation.frame[col]
+            chunk[col] = values.mask(values == schema.INVALID_CODE).astype('Int8') if col in CATEGORICAL_COLUMNS else values
+    predictions = np.full(len(chunk), np.nan)
+    if validation.n_invalid < len(chunk):
+        predictions[validation.valid] = engine.predict(validation.valid_frame())
+    chunk[PREDICTION_COLUMN] = predictions
+
+    if explainer is not None:
+        details = pd.DataFrame(np.nan, index=chunk.index, columns=explainer.output_columns)
+        if validation.n_invalid < len(chunk):
+            with tracing.span("explain", engine.model_filename, len(chunk)):
+                details = explainer.explain(validation.valid_frame(), predictions[validation.valid])
+            details = details.reindex(chunk.index)
+        for column in details.columns:
+            chunk[column] = details[column].to_numpy()
+    return chunk, validation.n_invalid
+
+
+def load_explainer(model_filename):
+    # A separate in-process copy: the engine may score in worker processes
+    backend = model_registry.get_backend(model_filename)
+    preprocessor = compile_preprocessor(model_registry.load_preprocessor(), backend_dtype(backend))
+    return Explainer.build(model_registry.load_model(model_filename), model_filename, preprocessor)
+
+
+def score_file(input_path, output_path, engine, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, explainer=None):
+    writer = open_writer(output_path)
+    total_rows = 0
+    invalid_rows = 0
+    start = time.perf_counter()
+    try:
+        chunks = iter_input_chunks(input_path, chunk_size)
+        while True:
+            # Reading is lazy, so the parse span has to wrap the iterator step itself
+            with tracing.span("parse", engine.model_filename) as parse_span:
+                chunk = next(chunks, None)
+                parse_span.rows = 0 if chunk is None else len(chunk)
+            if chunk is None:
+                break
+            scored, n_invalid = score_chunk(engine, chunk, explainer, coerce_features=is_parquet(output_path))
+            invalid_rows += n_invalid
+            with tracing.span("serialize", engine.model_filename, len(scored)):
+                writer.write(scored)
+            total_rows += len(chunk)
+            if progress is not None:
+                progress(total_rows, time.perf_counter() - start)
+    finally:
+        writer.close()
+    return total_rows, invalid_rows, time.perf_counter() - start
+
+
+def report_progress(rows, elapsed):
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    print(f"\r{rows:,} строк, {rate:,.0f} строк/с", end='', file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетное предсказание цен бриллиантов по CSV/Parquet файлу")
+    parser.add_argument("input", help="Входной файл (.csv или .parquet)")
+    parser.add_argument("output", help="Выходной файл (.csv или .parquet)")
+    parser.add_argument("--model", default="xgboost.pkl",
+                        help="Имя файла модели или её название из MODEL_FILES")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Количество строк в одном чанке")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Количество потоков/процессов для скоринга одного чанка (по умолчанию - число ядер)")
+    parser.add_argument("--native", action="store_true",
+                        help="Использовать нативный NumPy артефакт (native_export.py) вместо исходной модели")
+    parser.add_argument("--explain", action="store_true",
+                        help="Добавить доверительный интервал цены и вклад каждого признака (без --native)")
+    parser.add_argument("--metrics", help="Сохранить время этапов (parse/transform/predict/serialize) в JSON файл")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        parser.error(f"Входной файл не найден: {args.input}")
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size должен быть положительным")
+
+    if args.explain and args.native:
+        parser.error("--explain не поддерживается вместе с --native")
+
+    try:
+        model_filename = resolve_model_filename(args.model)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.native:
+        # Fails before any output is written when the artifact is missing or older than the model files
+        try:
+            native_runtime.load_native_model(model_filename)
+        except (FileNotFoundError, ValueError) as e:
+            parser.error(str(e))
+    explainer = load_explainer(model_filename) if args.explain else None
+
+    with ScoringEngine(model_filename, workers=args.workers, native=args.native) as engine:
+        rows, invalid_rows, elapsed = score_file(args.input, args.output, engine,
+                                   chunk_size=args.chunk_size, progress=report_progress, explainer=explainer)
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    print(file=sys.stderr)
+    print(f"Модель: {model_filename}. Обработано {rows:,} строк за {elapsed:.2f} с ({rate:,.0f} строк/с)")
+    if invalid_rows:
+        print(f"Пропущено {invalid_rows:,} строк с некорректными значениями, цена для них пустая")
+    if args.metrics:
+        tracing.write_metrics(args.metrics, tracing.tracer.snapshot())
+        print(f"Метрики этапов сохранены: {args.metrics}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
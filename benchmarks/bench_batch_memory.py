@@ -0,0 +1,113 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+from common import current_rss_mb, load_rows, peak_rss_mb
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+FLOWS = ("copy_csv", "inplace_csv", "inplace_parquet")
+
+
+def upload_bytes(n_rows, seed=0):
+    return load_rows(n_rows, seed).to_csv(index=False).encode('utf-8')
+
+
+def run_flow(flow, data, engine, prediction_cache, model_filename):
+    # Mirrors the batch branch of page_prediction.show_page after the file has been uploaded
+    import schema
+    from batch_results import export_bytes, score_valid_rows
+    from batch_score import PREDICTION_COLUMN
+
+    df_upload = pd.read_csv(io.BytesIO(data))
+    validation = schema.validate(df_upload)
+    if flow == "copy_csv":
+        # The previous flow: one prediction call, a full copy of the upload and the whole CSV in one string
+        predictions = prediction_cache.predict(model_filename, validation.valid_frame(), engine.predict)
+        result_df = df_upload.copy()
+        result_df[PREDICTION_COLUMN] = predictions
+        return len(result_df.to_csv(index=False).encode('utf-8'))
+    df_upload[PREDICTION_COLUMN] = score_valid_rows(
+        validation, lambda chunk: prediction_cache.predict(model_filename, chunk, engine.predict))
+    return len(export_bytes(df_upload, "parquet" if flow == "inplace_parquet" else "csv"))
+
+
+def measure(flow, n_rows, model_filename, seed, trace):
+    # Runs in a fresh spawned process, so peak RSS belongs to this flow and batch size alone.
+    # tracemalloc adds its own bookkeeping to RSS, hence separate traced and untraced runs.
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+    import tracemalloc
+    import warnings
+    warnings.simplefilter("ignore")
+    from prediction_cache import PredictionCache
+    from scoring_engine import ScoringEngine
+
+    data = upload_bytes(n_rows, seed)
+    engine = ScoringEngine(model_filename, workers=1)
+    # Warm-up outside the measurement: model load and framework initialisation are not part of a batch
+    engine.predict(pd.read_csv(io.BytesIO(data), nrows=10))
+    rss_before = current_rss_mb()
+
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    output_bytes = run_flow(flow, data, engine, PredictionCache(), model_filename)
+    seconds = time.perf_counter() - start
+    if trace:
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {"traced_peak_mb": traced_peak / (1024 * 1024)}
+    engine.close()
+
+    peak = peak_rss_mb()
+    return {
+        "seconds": seconds,
+        "rss_growth_mb": None if rss_before is None or peak is None else peak - rss_before,
+        "upload_mb": len(data) / (1024 * 1024),
+        "output_mb": output_bytes / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пиковая память пакетного предсказания и выгрузки результата")
+    parser.add_argument("--sizes", nargs="*", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--flows", nargs="*", choices=FLOWS, default=list(FLOWS))
+    parser.add_argument("--model", default="xgboost.pkl")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    print(f"{'rows':>10} {'flow':<16} {'seconds':>8} {'traced MB':>10} {'RSS +MB':>8} {'upload MB':>10} {'output MB':>10}")
+    for n_rows in args.sizes:
+        for flow in args.flows:
+            result = {}
+            for trace in (False, True):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result.update(executor.submit(measure, flow, n_rows, args.model, args.seed, trace).result())
+            results.setdefault(str(n_rows), {})[flow] = result
+            print(f"{n_rows:>10,} {flow:<16} {result['seconds']:>8.2f} {result['traced_peak_mb']:>10.1f} "
+                  f"{result['rss_growth_mb'] or 0:>8.1f} {result['upload_mb']:>10.1f} {result['output_mb']:>10.1f}")
+
+    print("output MB остаётся в памяти после выгрузки: Streamlit хранит данные download_button как bytes")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "results": results,
+                       "note": "output_mb stays in memory: Streamlit keeps download_button data as bytes"},
+                      f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
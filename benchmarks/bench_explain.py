@@ -0,0 +1,94 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import model_registry
+from common import best_time, load_rows
+from model_registry import MODEL_FILES
+
+DEFAULT_BATCH_SIZES = [1, 1000, 10_000]
+
+
+def measure_model(model_filename, batch_sizes, repeat, seed):
+    # Runs in a fresh spawned process, like bench_inference, so frameworks do not share threads or caches
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+    import warnings
+    warnings.simplefilter("ignore")
+    import explain
+    from fast_preprocess import backend_dtype, compile_preprocessor
+
+    backend = model_registry.get_backend(model_filename)
+    preprocessor = compile_preprocessor(model_registry.load_preprocessor(), backend_dtype(backend))
+    model = model_registry.load_model(model_filename)
+    start = time.perf_counter()
+    explainer = explain.Explainer.build(model, model_filename, preprocessor)
+    calibration_seconds = time.perf_counter() - start
+
+    rows = load_rows(max(batch_sizes), seed)
+    batches = {}
+    for batch_size in batch_sizes:
+        X = preprocessor.transform(rows.iloc[:batch_size])
+        predictions = model_registry.predict(model, X)
+        timings = {
+            "predict": best_time(lambda: model_registry.predict(model, X), repeat),
+            "interval": best_time(lambda: explain.prediction_interval(model, X, explainer.calibration, predictions),
+                                  repeat),
+        }
+        if explainer.supports_contributions:
+            timings["contributions"] = best_time(
+                lambda: explain.feature_contributions(model, X, explainer.groups, explainer.reference), repeat)
+        batches[str(batch_size)] = {
+            **{f"{name}_seconds": seconds for name, seconds in timings.items()},
+            **{f"{name}_ratio": seconds / timings["predict"] for name, seconds in timings.items() if name != "predict"},
+        }
+    return {
+        "calibration_method": explainer.calibration["method"],
+        "calibration_seconds": calibration_seconds,
+        "batches": batches,
+    }
+
+
+def format_ratio(batch, name):
+    ratio = batch.get(f"{name}_ratio")
+    return f"{'—':>14}" if ratio is None else f"{batch[f'{name}_seconds'] * 1000:>8.1f} x{ratio:<5.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость доверительного интервала и вклада признаков относительно predict")
+    parser.add_argument("--models", nargs="*", default=list(MODEL_FILES.values()))
+    parser.add_argument("--batch-sizes", nargs="*", type=int, default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    print(f"{'model':<22} {'rows':>7} {'predict ms':>11} {'interval ms':>14} {'contrib ms':>14}")
+    context = multiprocessing.get_context("spawn")
+    results, skipped = {}, {}
+    for model_filename in args.models:
+        if not os.path.exists(model_registry.model_path(model_filename)):
+            skipped[model_filename] = "файл модели не найден"
+            print(f"{model_filename:<22} пропущена: {skipped[model_filename]}")
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(measure_model, model_filename, args.batch_sizes, args.repeat, args.seed).result()
+        results[model_filename] = result
+        for batch_size, batch in result["batches"].items():
+            print(f"{model_filename:<22} {int(batch_size):>7,} {batch['predict_seconds'] * 1000:>11.2f} "
+                  f"{format_ratio(batch, 'interval')} {format_ratio(batch, 'contributions')}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "models": results, "skipped": skipped}, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+import model_registry
+from common import current_rss_mb, load_rows, peak_rss_mb
+from model_registry import MODEL_FILES, library_versions
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'inference_baseline.json')
+RESULTS_PATH = os.path.join(ROOT, 'benchmarks', 'inference_results.json')
+DEFAULT_BATCH_SIZES = [1, 100, 1000, 10_000]
+DEFAULT_THRESHOLD = 0.25
+
+
+def measure_model(model_filename, batch_sizes, single_row_repeat, repeat, seed):
+    # Runs in a fresh spawned process, so load time and RSS belong to this model alone
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+    import warnings
+    warnings.simplefilter("ignore")
+    from fast_preprocess import backend_dtype, compile_preprocessor
+
+    backend = model_registry.get_backend(model_filename)
+    rows = load_rows(max(batch_sizes + [single_row_repeat]), seed)
+    preprocessor = compile_preprocessor(model_registry.load_preprocessor(), backend_dtype(backend))
+
+    start = time.perf_counter()
+    model_registry.import_backend(backend)
+    import_seconds = time.perf_counter() - start
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    model = model_registry.load_model(model_filename)
+    load_seconds = time.perf_counter() - start
+    rss_after = current_rss_mb()
+
+    # The form path of the app: one dict row through the compiled preprocessor
+    records = rows.iloc[:single_row_repeat].to_dict('records')
+    model_registry.predict(model, preprocessor.transform(records[0]))
+    latencies = []
+    for record in records:
+        start = time.perf_counter()
+        model_registry.predict(model, preprocessor.transform(record))
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+
+    batches = {}
+    for batch_size in batch_sizes:
+        frame = rows.iloc[:batch_size]
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            model_registry.predict(model, preprocessor.transform(frame))
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        batches[str(batch_size)] = {
+            "seconds": best,
+            "median_seconds": float(np.median(timings)),
+            "rows_per_second": batch_size / best,
+        }
+
+    return {
+        "backend": backend,
+        "import_seconds": import_seconds,
+        "load_seconds": load_seconds,
+        "model_rss_mb": None if rss_before is None else rss_after - rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+        "single_row": {
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "mean_ms": float(latencies.mean()),
+        },
+        "batches": batches,
+    }
+
+
+def run_benchmarks(model_filenames, batch_sizes, single_row_repeat, repeat, seed, progress=print):
+    results, skipped = {}, {}
+    context = multiprocessing.get_context("spawn")
+    for model_filename in model_filenames:
+        if not os.path.exists(model_registry.model_path(model_filename)):
+            skipped[model_filename] = "файл модели не найден"
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            try:
+                results[model_filename] = executor.submit(
+                    measure_model, model_filename, batch_sizes, single_row_repeat, repeat, seed).result()
+            except Exception as e:
+                skipped[model_filename] = str(e)
+                continue
+        progress(format_row(model_filename, results[model_filename], batch_sizes))
+    return results, skipped
+
+
+def format_row(model_filename, result, batch_sizes):
+    batches = " ".join(f"{result['batches'][str(size)]['rows_per_second']:>12,.0f}" for size in batch_sizes)
+    cold_load = result['import_seconds'] + result['load_seconds']
+    return (f"{model_filename:<22} {cold_load:>7.2f} {result['peak_rss_mb'] or 0:>8.0f} "
+            f"{result['single_row']['p50_ms']:>8.2f} {result['single_row']['p95_ms']:>8.2f} {batches}")
+
+
+def gated_metrics(result):
+    # Latencies only: load time and RSS are reported but too noisy to fail a build on
+    metrics = {"single_row.p50_ms": result["single_row"]["p50_ms"]}
+    for batch_size, batch in result["batches"].items():
+        metrics[f"batch_{batch_size}.seconds"] = batch["seconds"]
+    return metrics
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for model_filename, result in results.items():
+        reference = baseline.get("models", {}).get(model_filename)
+        if reference is None:
+            continue
+        reference_metrics = gated_metrics(reference)
+        for name, value in gated_metrics(result).items():
+            if name not in reference_metrics or reference_metrics[name] <= 0:
+                continue
+            ratio = value / reference_metrics[name]
+            if ratio > 1 + threshold:
+                regressions.append({"model": model_filename, "metric": name, "baseline": reference_metrics[name],
+                                    "current": value, "ratio": ratio})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка, пропускная способность, время загрузки и память всех моделей")
+    parser.add_argument("--models", nargs="*", default=list(MODEL_FILES.values()))
+    parser.add_argument("--batch-sizes", nargs="*", type=int, default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--single-row-repeat", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=RESULTS_PATH, help="Куда сохранить результаты")
+    parser.add_argument("--baseline", help="Сравнить с сохранёнными результатами (JSON)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Допустимое относительное замедление, 0.25 = на 25%%")
+    parser.add_argument("--save-baseline", action="store_true", help="Записать результаты как новый baseline")
+    args = parser.parse_args()
+
+    batch_columns = " ".join(f"{f'rows/s @{size}':>12}" for size in args.batch_sizes)
+    print(f"{'model':<22} {'load s':>7} {'peak MB':>8} {'p50 ms':>8} {'p95 ms':>8} {batch_columns}")
+    results, skipped = run_benchmarks(args.models, args.batch_sizes, args.single_row_repeat, args.repeat, args.seed)
+    for model_filename, reason in skipped.items():
+        print(f"{model_filename:<22} пропущена: {reason}")
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {"platform": platform.platform(), "processor": platform.processor(),
+                    "cpu_count": os.cpu_count(), "python": platform.python_version()},
+        "libraries": library_versions(),
+        "settings": {"batch_sizes": args.batch_sizes, "single_row_repeat": args.single_row_repeat,
+                     "repeat": args.repeat, "seed": args.seed},
+        "models": results,
+        "skipped": skipped,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        report["regressions"] = regressions
+        for regression in regressions:
+            print(f"РЕГРЕССИЯ {regression['model']} {regression['metric']}: {regression['baseline']:.4g} -> "
+                  f"{regression['current']:.4g} (x{regression['ratio']:.2f})")
+        if regressions:
+            exit_code = 1
+        else:
+            print(f"\nРегрессий больше {args.threshold:.0%} относительно {args.baseline} нет")
+
+    for path in [args.json] + ([BASELINE_PATH] if args.save_baseline else []):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import model_registry
+import native_runtime
+from common import best_time, load_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка нативного рантайма против исходных моделей")
+    parser.add_argument("--batch-sizes", nargs="*", type=int, default=[1, 100, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Сохранить результаты в JSON файл")
+    args = parser.parse_args()
+
+    artifact = native_runtime.load_artifact()
+    preprocessor = model_registry.load_preprocessor()
+    originals = {name: model_registry.load_model(name) for name in artifact.models}
+
+    results = {}
+    print(f"{'model':<22} {'batch':>8} {'original ms':>12} {'native ms':>10} {'speedup':>8}")
+    for batch_size in args.batch_sizes:
+        frame = load_rows(batch_size)
+        repeat = args.repeat if batch_size < 10_000 else max(1, args.repeat // 2)
+        for model_filename, model in originals.items():
+            native_model = artifact.models[model_filename]
+            original = best_time(lambda: model_registry.predict(model, preprocessor.transform(frame)), repeat)
+            native = best_time(lambda: native_model.predict(artifact.preprocessor.transform(frame)), repeat)
+            results.setdefault(model_filename, {})[batch_size] = {"original_s": original, "native_s": native}
+            print(f"{model_filename:<22} {batch_size:>8} {original * 1000:>12.3f} {native * 1000:>10.3f} "
+                  f"{original / native:>7.1f}x")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+
+import model_registry
+from common import best_time, load_rows
+from fast_preprocess import CompiledPreprocessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость скомпилированного препроцессора")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Сохранить результаты в JSON файл")
+    args = parser.parse_args()
+
+    preprocessor = model_registry.load_preprocessor()
+    compiled = CompiledPreprocessor.from_sklearn(preprocessor)
+
+    row = load_rows(1).iloc[0].to_dict()
+    single_out = np.empty((1, compiled.n_features_out), dtype=compiled.dtype)
+    big = load_rows(args.rows)
+    big_array = big.to_numpy()
+    big_out = np.empty((len(big), compiled.n_features_out), dtype=compiled.dtype)
+
+    cases = {
+        "1 row": (
+            lambda: preprocessor.transform(pd.DataFrame([row])),
+            lambda: compiled.transform(row, out=single_out),
+            args.repeat * 100,
+        ),
+        f"{args.rows:,} rows": (
+            lambda: preprocessor.transform(big),
+            lambda: compiled.transform(big_array, out=big_out),
+            args.repeat,
+        ),
+    }
+    results = {}
+    print(f"{'input':<16} {'sklearn ms':>12} {'compiled ms':>12} {'speedup':>8}")
+    for name, (baseline, fast, repeat) in cases.items():
+        sklearn_s = best_time(baseline, repeat)
+        compiled_s = best_time(fast, repeat)
+        results[name] = {"sklearn_s": sklearn_s, "compiled_s": compiled_s}
+        print(f"{name:<16} {sklearn_s * 1000:>12.3f} {compiled_s * 1000:>12.3f} {sklearn_s / compiled_s:>7.1f}x")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
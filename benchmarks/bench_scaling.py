@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from common import best_time, load_rows
+from model_registry import MODEL_FILES, model_path
+from scoring_engine import BACKEND_POOLS, ScoringEngine, default_workers
+
+
+def worker_counts(max_workers):
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    return counts
+
+
+def measure(engine, frame, repeat):
+    engine.predict(frame.iloc[:engine.min_shard_rows * engine.workers])  # warm up pool and models
+    return len(frame) / best_time(lambda: engine.predict(frame), repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Масштабирование пакетного скоринга по числу ядер")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-workers", type=int, default=default_workers())
+    parser.add_argument("--models", nargs="*", default=list(MODEL_FILES.values()))
+    parser.add_argument("--json", help="Сохранить результаты в JSON файл")
+    args = parser.parse_args()
+
+    frame = load_rows(args.rows)
+    results = {}
+    for model_filename in args.models:
+        if not os.path.exists(model_path(model_filename)):
+            print(f"{model_filename}: файл модели не найден, пропуск")
+            continue
+        results[model_filename] = {}
+        baseline = None
+        for workers in worker_counts(args.max_workers):
+            with ScoringEngine(model_filename, workers=workers) as engine:
+                rows_per_sec = measure(engine, frame, args.repeat)
+            baseline = baseline or rows_per_sec
+            results[model_filename][workers] = rows_per_sec
+            print(f"{model_filename:<22} {engine.pool:<8} workers={workers:<3} "
+                  f"{rows_per_sec:>12,.0f} строк/с  x{rows_per_sec / baseline:.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rows": args.rows, "pools": BACKEND_POOLS, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from common import load_rows
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def post(reader, writer, path, payload):
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    response = await reader.readexactly(length)
+    if b" 200 " not in status_line:
+        raise RuntimeError(response.decode("utf-8"))
+    return json.loads(response)
+
+
+async def client(port, path, rows, deadline, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await post(reader, writer, path, rows[i % len(rows)])
+            latencies.append(time.perf_counter() - start)
+            i += 1
+    finally:
+        writer.close()
+
+
+async def wait_until_ready(port, path, row, timeout=120):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            # The first request also loads the model
+            await post(reader, writer, path, row)
+            writer.close()
+            return
+        except (ConnectionError, OSError):
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def run_load(port, path, rows, concurrency, duration):
+    await wait_until_ready(port, path, rows[0])
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, path, rows, start + duration, latencies) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def run_scenario(model_filename, server_args, rows, concurrency, duration):
+    port = free_port()
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3", PYTHONWARNINGS="ignore")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "inference_server.py"), "--port", str(port), *server_args],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        return asyncio.run(run_load(port, f"/predict/{model_filename}", rows, concurrency, duration))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест HTTP сервиса с микро-батчингом и без")
+    parser.add_argument("--model", default="mlp.h5")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--batch-window-ms", type=float, default=5.0)
+    parser.add_argument("--json", help="Сохранить результаты в JSON файл")
+    args = parser.parse_args()
+
+    rows = load_rows(1000).to_dict("records")
+
+    scenarios = {
+        "batching": ["--batch-window-ms", str(args.batch_window_ms)],
+        "no_batching": ["--no-batching"],
+    }
+    results = {}
+    for name, server_args in scenarios.items():
+        result = run_scenario(args.model, server_args, rows, args.concurrency, args.duration)
+        results[name] = result
+        print(f"{args.model} {name:<12} {result['throughput_rps']:>9,.0f} req/s  "
+              f"p50={result['p50_ms']:.1f} ms  p99={result['p99_ms']:.1f} ms  ({result['requests']} запросов)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "concurrency": args.concurrency, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed in a fresh interpreter so that every measurement starts from a cold import cache
+PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+import os
+os.chdir({root!r})
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+import model_registry
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "backends": model_registry.loaded_backends(),
+}}))
+"""
+
+SCENARIOS = {
+    "page_dataset_info": "import page_dataset_info",
+    "page_visualizations": "import page_visualizations",
+    "page_prediction": "import page_prediction",
+    "all_pages": "import page_dataset_info, page_visualizations, page_prediction",
+    "eager_tensorflow": "import page_prediction, tensorflow",
+}
+
+
+def model_scenarios():
+    from model_registry import MODEL_FILES, model_path
+
+    scenarios = {}
+    for model_filename in MODEL_FILES.values():
+        if os.path.exists(os.path.join(ROOT, model_path(model_filename))):
+            scenarios[f"first_load:{model_filename}"] = (
+                f"import model_registry; model_registry.load_model({model_filename!r})"
+            )
+    return scenarios
+
+
+def run_probe(statement):
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3", PYTHONWARNINGS="ignore")
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE.format(root=ROOT, statement=statement)],
+        capture_output=True, text=True, env=env, cwd=ROOT
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного импорта страниц и первой загрузки моделей")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-models", action="store_true")
+    parser.add_argument("--json", help="Сохранить результаты в JSON файл")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    scenarios = dict(SCENARIOS)
+    if not args.skip_models:
+        scenarios.update(model_scenarios())
+
+    results = {}
+    print(f"{'scenario':<36} {'best s':>8} {'rss MB':>8}  backends")
+    for name, statement in scenarios.items():
+        runs = [run_probe(statement) for _ in range(args.repeat)]
+        ok_runs = [run for run in runs if "error" not in run]
+        if not ok_runs:
+            results[name] = runs[0]
+            print(f"{name:<36} {'error':>8}  {runs[0]['error']}")
+            continue
+        best = min(ok_runs, key=lambda run: run["seconds"])
+        results[name] = best
+        print(f"{name:<36} {best['seconds']:>8.3f} {best['max_rss_mb']:>8.1f}  {','.join(best['backends']) or '-'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
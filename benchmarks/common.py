@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_registry import FEATURE_COLUMNS
+
+# Helpers shared by the benchmark scripts; each script puts the repository root on sys.path before importing this
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_rows(n_rows, seed=0):
+    df = pd.read_csv(os.path.join(ROOT, 'post_diamonds.csv'))[FEATURE_COLUMNS]
+    rng = np.random.default_rng(seed)
+    return df.iloc[rng.integers(0, len(df), n_rows)].reset_index(drop=True)
+
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
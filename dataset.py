@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from model_registry import file_digest
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(ROOT_DIR, 'post_diamonds.csv')
+CACHE_DIR = os.path.join(ROOT_DIR, '.cache')
+
+CATEGORICAL_COLUMNS = ['cut', 'color', 'clarity']
+NUMERIC_COLUMNS = ['carat', 'depth', 'table', 'x', 'y', 'z']
+TARGET_COLUMN = 'price'
+
+COLUMN_DTYPES = {
+    **{col: np.int8 for col in CATEGORICAL_COLUMNS},
+    **{col: np.float32 for col in NUMERIC_COLUMNS},
+    TARGET_COLUMN: np.int32
+}
+
+# Codes stored in post_diamonds.csv: 0 is the most valuable grade, in the order the form lists them
+CATEGORY_LABELS = {
+    'cut': {0: 'Ideal', 1: 'Premium', 2: 'Very Good', 3: 'Good', 4: 'Fair'},
+    'color': {0: 'D', 1: 'E', 2: 'F', 3: 'G', 4: 'H', 5: 'I', 6: 'J'},
+    'clarity': {0: 'IF', 1: 'VVS1', 2: 'VVS2', 3: 'VS1', 4: 'VS2', 5: 'SI1', 6: 'SI2', 7: 'I1'}
+}
+
+_STATS_KEY = '__stats__'
+_COLUMNS_KEY = '__columns__'
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+class DiamondsDataset:
+    def __init__(self, columns, stats, digest):
+        self.columns = columns
+        self.stats = stats
+        self.digest = digest
+
+    def __len__(self):
+        return self.stats['rows']
+
+    def to_frame(self, decode=True, rows=None):
+        data = {name: (values if rows is None else values[rows]) for name, values in self.columns.items()}
+        df = pd.DataFrame(data, copy=False)
+        if decode:
+            df['table'] = df['table'].astype(int)
+            for col, labels in CATEGORY_LABELS.items():
+                df[col] = df[col].map(labels)
+        return df
+
+    def head(self, n=5, decode=True):
+        return self.to_frame(decode=decode, rows=slice(0, n))
+
+
+def category_label(column, code):
+    return CATEGORY_LABELS[column].get(code, str(code))
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def compute_stats(columns):
+    stats = {'rows': int(len(columns[TARGET_COLUMN]))}
+    for name in NUMERIC_COLUMNS + [TARGET_COLUMN]:
+        values = columns[name]
+        stats[name] = {
+            'min': values.min().item(),
+            'max': values.max().item(),
+            'mean': values.mean(dtype=np.float64).item()
+        }
+    for name in CATEGORICAL_COLUMNS:
+        codes, counts = np.unique(columns[name], return_counts=True)
+        stats[name] = {'codes': codes.tolist(), 'counts': counts.tolist()}
+    return stats
+
+
+def parse_csv(path):
+    df = pd.read_csv(path, dtype=COLUMN_DTYPES)
+    return {name: df[name].to_numpy() for name in df.columns}
+
+
+def cache_path(path, digest):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{stem}-{digest[:16]}.npz")
+
+
+def read_cache(path):
+    with np.load(path, allow_pickle=False) as data:
+        names = json.loads(str(data[_COLUMNS_KEY]))
+        columns = {name: data[name] for name in names}
+        stats = json.loads(str(data[_STATS_KEY]))
+    return columns, stats
+
+
+def write_cache(path, columns, stats):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **columns, **{_COLUMNS_KEY: np.array(json.dumps(list(columns))),
+                                  _STATS_KEY: np.array(json.dumps(stats))})
+    os.replace(tmp_path, path)
+
+    # Cache files of previous versions of the same CSV are no longer reachable
+    prefix = os.path.basename(path).rsplit('-', 1)[0] + '-'
+    for name in os.listdir(os.path.dirname(path)):
+        stale = os.path.join(os.path.dirname(path), name)
+        if name.startswith(prefix) and name.endswith('.npz') and stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def build_dataset(path):
+    digest = file_digest(path)
+    cached = cache_path(path, digest)
+    if os.path.exists(cached):
+        try:
+            columns, stats = read_cache(cached)
+            return DiamondsDataset(columns, stats, digest)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    columns = parse_csv(path)
+    stats = compute_stats(columns)
+    try:
+        write_cache(cached, columns, stats)
+    except OSError:
+        pass
+    return DiamondsDataset(columns, stats, digest)
+
+
+def load_dataset(path=DATASET_PATH):
+    # The in-memory copy is shared by every session of the process and is rebuilt only when the
+    # CSV's mtime or size changes; the on-disk cache is keyed on the content hash
+    signature = file_signature(path)
+    with _lock:
+        entry = _loaded.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        dataset = build_dataset(path)
+        _loaded[path] = (signature, dataset)
+        return dataset
@@ -0,0 +1,219 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+import model_registry
+from model_registry import FEATURE_COLUMNS
+
+DEFAULT_COVERAGE = 0.9
+VIRTUAL_ENSEMBLES = 10
+# Floors for the interval scale, so unanimous members or tiny predictions do not give a zero-width interval
+MIN_SPREAD = 1.0
+MIN_PRICE = 100.0
+CALIBRATION_ROWS = 5000
+
+LOW_COLUMN = 'price_low'
+HIGH_COLUMN = 'price_high'
+BASE_COLUMN = 'base_price'
+CONTRIBUTION_PREFIX = 'contribution_'
+
+
+def contribution_column(feature):
+    return f"{CONTRIBUTION_PREFIX}{feature}"
+
+
+def _xgboost_rounds(model):
+    best_iteration = getattr(model, 'best_iteration', None)
+    return best_iteration + 1 if best_iteration is not None else model.get_booster().num_boosted_rounds()
+
+
+def _lightgbm_rounds(model):
+    return model.best_iteration_ or model.booster_.current_iteration()
+
+
+def _prefix_ends(n_rounds, n_members):
+    # Virtual ensemble members are the model truncated at evenly spaced points of its second half
+    return np.unique(np.linspace(max(1, n_rounds // 2), n_rounds, n_members).round().astype(int))
+
+
+def _cumulative_segments(predict_range, ends, base=0.0):
+    # Every prefix prediction in one pass over the trees: score disjoint segments and accumulate them
+    segments = [predict_range(0, ends[0])]
+    segments += [predict_range(start, stop) - base for start, stop in zip(ends[:-1], ends[1:])]
+    return np.cumsum(np.stack(segments, axis=1), axis=1)
+
+
+def member_predictions(model, X, n_members=VIRTUAL_ENSEMBLES):
+    # (rows, members) predictions whose spread reflects model uncertainty, or None for single models
+    kind = type(model).__name__
+    if kind == 'BaggingRegressor':
+        return np.stack([estimator.predict(X[:, features])
+                         for estimator, features in zip(model.estimators_, model.estimators_features_)], axis=1)
+    if kind == 'CatBoostRegressor':
+        return model.virtual_ensembles_predict(X, prediction_type='VirtEnsembles',
+                                               virtual_ensembles_count=n_members)[:, :, 0]
+    if kind == 'XGBRegressor':
+        import xgboost
+
+        booster = model.get_booster()
+        learner = json.loads(booster.save_config())['learner']
+        # Each iteration range prediction includes base_score, so it is removed from all but the first segment
+        base = float(learner['learner_model_param']['base_score'].strip('[]'))
+        matrix = xgboost.DMatrix(X)
+        return _cumulative_segments(lambda start, stop: booster.predict(matrix, iteration_range=(start, stop)),
+                                    _prefix_ends(_xgboost_rounds(model), n_members), base)
+    if kind == 'LGBMRegressor':
+        booster = model.booster_
+        return _cumulative_segments(
+            lambda start, stop: booster.predict(X, start_iteration=start, num_iteration=stop - start),
+            _prefix_ends(_lightgbm_rounds(model), n_members))
+    return None
+
+
+def _scale(predictions, members):
+    # Price errors grow with the price; the member spread adds which rows the model itself is unsure about.
+    # Their geometric mean gave narrower intervals than either alone at the same coverage.
+    price = np.maximum(predictions, MIN_PRICE)
+    if members is None:
+        return price
+    return np.sqrt(price * np.maximum(members.std(axis=1), MIN_SPREAD))
+
+
+def calibrate(model, X, y, coverage=DEFAULT_COVERAGE):
+    # Split conformal calibration on held-out rows: raw member spreads are far narrower than the real error,
+    # so the half-width is the scale times the coverage quantile of |error| / scale
+    predictions = model_registry.predict(model, X)
+    members = member_predictions(model, X)
+    scores = np.abs(np.asarray(y, dtype=np.float64) - predictions) / _scale(predictions, members)
+    level = min(1.0, np.ceil((len(scores) + 1) * coverage) / len(scores))
+    return {
+        "coverage": coverage,
+        "method": "members" if members is not None else "relative",
+        "quantile": float(np.quantile(scores, level, method='higher')),
+        "rows": len(scores),
+    }
+
+
+def prediction_interval(model, X, calibration, predictions=None):
+    if predictions is None:
+        predictions = model_registry.predict(model, X)
+    members = member_predictions(model, X) if calibration["method"] == "members" else None
+    half_width = calibration["quantile"] * _scale(predictions, members)
+    return np.maximum(predictions - half_width, 0.0), predictions + half_width
+
+
+def feature_groups(preprocessor):
+    # (processed features, raw features) 0/1 matrix: one-hot columns are summed back into their category
+    groups = np.zeros((preprocessor.n_features_out, len(FEATURE_COLUMNS)))
+    for j, col in enumerate(preprocessor.numeric_columns):
+        groups[j, FEATURE_COLUMNS.index(col)] = 1
+    offset = len(preprocessor.numeric_columns)
+    for col, cats in zip(preprocessor.categorical_columns, preprocessor.categories):
+        groups[offset:offset + len(cats), FEATURE_COLUMNS.index(col)] = 1
+        offset += len(cats)
+    return groups
+
+
+def _quadratic_contributions(model, X, reference):
+    # Exact Shapley values of a degree-2 polynomial against a single reference point: linear and square
+    # terms go to their feature, each cross term x_i*x_j is split as (x_i - r_i)(x_j + r_j) / 2
+    from native_export import export_polynomial
+
+    quadratic = export_polynomial(model)
+    X = np.asarray(X, dtype=np.float64)
+    delta, total = X - reference, X + reference
+    diagonal = np.diag(quadratic.quadratic)
+    cross = quadratic.quadratic + quadratic.quadratic.T
+    np.fill_diagonal(cross, 0.0)
+    contributions = delta * (quadratic.linear + diagonal * total + 0.5 * total @ cross)
+    base = quadratic.predict(reference[None, :])[0]
+    return np.column_stack([contributions, np.full(len(X), base)])
+
+
+def _is_polynomial(model):
+    return type(model).__name__ == 'Pipeline' and any(type(step).__name__ == 'PolynomialFeatures'
+                                                       for _, step in model.steps)
+
+
+def has_contributions(model):
+    return type(model).__name__ in ('XGBRegressor', 'LGBMRegressor', 'CatBoostRegressor') or _is_polynomial(model)
+
+
+def processed_contributions(model, X, reference=None):
+    # (rows, processed features + 1) contributions with the base value in the last column
+    kind = type(model).__name__
+    if kind == 'XGBRegressor':
+        import xgboost
+
+        return model.get_booster().predict(xgboost.DMatrix(X), pred_contribs=True,
+                                           iteration_range=(0, _xgboost_rounds(model)))
+    if kind == 'LGBMRegressor':
+        return model.booster_.predict(X, pred_contrib=True, num_iteration=_lightgbm_rounds(model))
+    if kind == 'CatBoostRegressor':
+        from catboost import Pool
+
+        return model.get_feature_importance(Pool(X), type='ShapValues')
+    if _is_polynomial(model):
+        if reference is None:
+            raise ValueError("Для полиномиальной модели нужна опорная точка (средние признаки обучающей выборки)")
+        return _quadratic_contributions(model, X, reference)
+    raise NotImplementedError(f"Вклад признаков для модели {kind} не поддерживается")
+
+
+def feature_contributions(model, X, groups, reference=None):
+    contributions = processed_contributions(model, X, reference)
+    return contributions[:, -1], contributions[:, :-1] @ groups
+
+
+def reference_sample(preprocessor, rows=CALIBRATION_ROWS, seed=0):
+    # Fixed sample of post_diamonds.csv: reference point for the polynomial and fallback calibration set
+    import dataset
+
+    frame = dataset.load_dataset().to_frame(decode=False)
+    sample = frame.iloc[np.random.default_rng(seed).choice(len(frame), min(rows, len(frame)), replace=False)]
+    return preprocessor.transform(sample[FEATURE_COLUMNS]), sample[dataset.TARGET_COLUMN].to_numpy()
+
+
+class Explainer:
+    def __init__(self, model, preprocessor, calibration, reference):
+        self.model = model
+        self.preprocessor = preprocessor
+        self.calibration = calibration
+        self.reference = reference
+        self.groups = feature_groups(preprocessor)
+
+    @classmethod
+    def build(cls, model, model_filename, preprocessor, coverage=DEFAULT_COVERAGE):
+        # Prefer the calibration train.py measured on its validation split; models without one are
+        # calibrated on the dataset sample, which they may have been trained on, so the interval can be narrow
+        X_ref, y_ref = reference_sample(preprocessor)
+        manifest = model_registry.load_manifest() or {}
+        calibration = manifest.get("models", {}).get(model_filename, {}).get("interval")
+        if calibration is None or calibration["coverage"] != coverage:
+            calibration = {**calibrate(model, X_ref, y_ref, coverage), "source": "dataset"}
+        return cls(model, preprocessor, calibration, np.asarray(X_ref, dtype=np.float64).mean(axis=0))
+
+    @property
+    def supports_contributions(self):
+        return has_contributions(self.model)
+
+    @property
+    def output_columns(self):
+        columns = [LOW_COLUMN, HIGH_COLUMN]
+        if self.supports_contributions:
+            columns += [BASE_COLUMN] + [contribution_column(feature) for feature in FEATURE_COLUMNS]
+        return columns
+
+    def explain(self, frame, predictions=None):
+        # Interval bounds, base value and per-feature contributions for a whole batch
+        X = self.preprocessor.transform(frame)
+        if predictions is None:
+            predictions = model_registry.predict(self.model, X)
+        columns = {}
+        columns[LOW_COLUMN], columns[HIGH_COLUMN] = prediction_interval(self.model, X, self.calibration, predictions)
+        if self.supports_contributions:
+            columns[BASE_COLUMN], contributions = feature_contributions(self.model, X, self.groups, self.reference)
+            for j, feature in enumerate(FEATURE_COLUMNS):
+                columns[contribution_column(feature)] = contributions[:, j]
+        return pd.DataFrame(columns, index=getattr(frame, 'index', None))
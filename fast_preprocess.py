@@ -0,0 +1,122 @@
+import numpy as np
+
+from model_registry import FEATURE_COLUMNS
+
+# The degree-2 polynomial model amplifies float32 rounding of its inputs; every other backend
+# either evaluates in float32 itself or is insensitive to it
+BACKEND_DTYPES = {
+    "sklearn": np.float64
+}
+
+
+class CompiledPreprocessor:
+    # Fitted StandardScaler + OneHotEncoder(handle_unknown='ignore') parameters of the
+    # ColumnTransformer, applied straight to column arrays without building a DataFrame
+    def __init__(self, numeric_columns, mean, scale, categorical_columns, categories, dtype=np.float32):
+        self.numeric_columns = list(numeric_columns)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.categorical_columns = list(categorical_columns)
+        self.categories = [list(cats) for cats in categories]
+        self.dtype = np.dtype(dtype)
+        self.n_features_out = len(self.numeric_columns) + sum(len(cats) for cats in self.categories)
+
+        self._offsets = np.cumsum([len(self.numeric_columns)] + [len(cats) for cats in self.categories])[:-1]
+        # Integer categories 0..k-1 (the codes the models were fitted on) are one-hot encoded
+        # by scattering, anything else by comparing against each category
+        self._dense_codes = [
+            all(isinstance(c, (int, np.integer)) and c == i for i, c in enumerate(cats))
+            for cats in self.categories
+        ]
+
+    @classmethod
+    def from_sklearn(cls, preprocessor, dtype=np.float32):
+        if getattr(preprocessor, 'remainder', 'drop') != 'drop':
+            raise NotImplementedError("Поддерживается только remainder='drop'")
+
+        numeric_columns, means, scales = [], [], []
+        categorical_columns, categories = [], []
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == 'drop' or name == 'remainder':
+                continue
+            kind = type(transformer).__name__
+            if kind == 'StandardScaler':
+                if categorical_columns:
+                    raise NotImplementedError("Числовые колонки должны идти перед категориальными")
+                numeric_columns.extend(columns)
+                means.extend(transformer.mean_ if transformer.with_mean else np.zeros(len(columns)))
+                scales.extend(transformer.scale_ if transformer.with_std else np.ones(len(columns)))
+            elif kind == 'OneHotEncoder':
+                if transformer.drop is not None or transformer.handle_unknown != 'ignore':
+                    raise NotImplementedError("Поддерживается только OneHotEncoder(drop=None, handle_unknown='ignore')")
+                categorical_columns.extend(columns)
+                categories.extend([c.item() if hasattr(c, 'item') else c for c in cats]
+                                  for cats in transformer.categories_)
+            else:
+                raise NotImplementedError(f"Неподдерживаемый шаг препроцессора: {kind}")
+        return cls(numeric_columns, means, scales, categorical_columns, categories, dtype=dtype)
+
+    def _columns(self, data):
+        # Accepts a DataFrame, a mapping of column -> scalar/array, or a raw 2D array whose
+        # columns follow FEATURE_COLUMNS
+        if isinstance(data, np.ndarray):
+            if data.ndim == 1:
+                data = data.reshape(1, -1)
+            return {col: data[:, i] for i, col in enumerate(FEATURE_COLUMNS)}
+        return data
+
+    def transform(self, data, out=None):
+        columns = self._columns(data)
+        n_rows = np.size(columns[self.numeric_columns[0]])
+        if out is None:
+            out = np.zeros((n_rows, self.n_features_out), dtype=self.dtype)
+        else:
+            out[:n_rows] = 0
+            out = out[:n_rows]
+
+        for j, col in enumerate(self.numeric_columns):
+            values = np.asarray(columns[col], dtype=np.float64).reshape(-1)
+            out[:, j] = (values - self.mean[j]) / self.scale[j]
+
+        rows = None
+        for col, cats, offset, dense in zip(self.categorical_columns, self.categories,
+                                            self._offsets, self._dense_codes):
+            values = np.asarray(columns[col]).reshape(-1)
+            if dense and values.dtype.kind in 'iuf':
+                if rows is None:
+                    rows = np.arange(n_rows)
+                codes = values
+                valid = (values >= 0) & (values < len(cats))
+                if values.dtype.kind == 'f':
+                    # 3.0 matches category 3 like the equality path would, 2.5 and NaN match nothing
+                    codes = np.where(valid, values, 0).astype(np.int64)
+                    valid &= codes == values
+                out[rows[valid], offset + codes[valid]] = 1
+            else:
+                for j, category in enumerate(cats):
+                    out[:, offset + j] = values == category
+        return out
+
+    def to_arrays(self):
+        spec = {
+            'numeric_columns': self.numeric_columns,
+            'categorical_columns': self.categorical_columns,
+            'categories': self.categories,
+            'dtype': self.dtype.name,
+        }
+        return spec, {'mean': self.mean, 'scale': self.scale}
+
+    @classmethod
+    def from_arrays(cls, spec, arrays):
+        return cls(spec['numeric_columns'], arrays['mean'], arrays['scale'],
+                   spec['categorical_columns'], spec['categories'], dtype=spec.get('dtype', 'float64'))
+
+
+def backend_dtype(backend):
+    return BACKEND_DTYPES.get(backend, np.float32)
+
+
+def compile_preprocessor(preprocessor, dtype=np.float32):
+    if isinstance(preprocessor, CompiledPreprocessor):
+        return preprocessor
+    return CompiledPreprocessor.from_sklearn(preprocessor, dtype=dtype)
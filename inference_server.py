@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import model_registry
+import native_runtime
+import schema
+import tracing
+from fast_preprocess import backend_dtype, compile_preprocessor
+from model_registry import FEATURE_COLUMNS, MODEL_FILES
+
+DEFAULT_BATCH_WINDOW_MS = 5.0
+DEFAULT_MAX_BATCH_SIZE = 256
+MAX_BODY_BYTES = 1 << 20
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+# Text exposition format of Prometheus, served on /metrics
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def content_length(headers):
+    value = headers.get("content-length", "0")
+    try:
+        length = int(value)
+    except ValueError:
+        raise HttpError(400, f"Некорректный Content-Length: {value}")
+    if length < 0:
+        raise HttpError(400, f"Некорректный Content-Length: {value}")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "Слишком большое тело запроса")
+    return length
+
+
+def validate_rows(rows):
+    # Coerces a request with the same checks as uploaded files, so only clean rows reach a shared micro-batch
+    if not rows:
+        return rows
+    for row in rows:
+        if not isinstance(row, dict):
+            raise HttpError(400, "Ожидается объект с признаками или список объектов")
+        missing_cols = [col for col in FEATURE_COLUMNS if col not in row]
+        if missing_cols:
+            raise HttpError(400, f"Отсутствуют признаки: {', '.join(missing_cols)}")
+        # JSON true/false would otherwise be read as 1.0/0.0
+        malformed = [col for col in FEATURE_COLUMNS if isinstance(row[col], (dict, list, bool))]
+        if malformed:
+            raise HttpError(400, f"Некорректные значения признаков: {', '.join(malformed)}")
+
+    validation = schema.validate(pd.DataFrame({col: [row[col] for row in rows] for col in FEATURE_COLUMNS}))
+    if validation.n_invalid:
+        errors = [f"строка {row}: {message}" if len(rows) > 1 else message
+                  for row, message in validation.report().itertuples(index=False)]
+        raise HttpError(400, "; ".join(errors))
+    return validation.frame.to_dict("records")
+
+
+class MicroBatcher:
+    # Collects concurrent single-row requests for one model and scores them with a single
+    # preprocessor.transform + model.predict call once the window closes or the batch is full
+    def __init__(self, model_filename, model, preprocessor, executor, batch_window_ms, max_batch_size):
+        self.model_filename = model_filename
+        self.model = model
+        self.preprocessor = preprocessor
+        self.executor = executor
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.rows = 0
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, row):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((row, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                while len(batch) < self.max_batch_size and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _score(self, rows):
+        with tracing.span("transform", self.model_filename, len(rows)):
+            columns = {col: np.array([row[col] for row in rows]) for col in FEATURE_COLUMNS}
+            processed = self.preprocessor.transform(columns)
+        with tracing.span("predict", self.model_filename, len(rows)):
+            return model_registry.predict(self.model, processed)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            rows = [row for row, _ in batch]
+            try:
+                predictions = await loop.run_in_executor(self.executor, self._score, rows)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += len(rows)
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(float(prediction))
+
+    def close(self):
+        self._task.cancel()
+
+
+class InferenceServer:
+    def __init__(self, batch_window_ms=DEFAULT_BATCH_WINDOW_MS, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 native=False):
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max_batch_size
+        self.native = native
+        # One scoring thread per server keeps framework calls serialized, batching provides the throughput
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.preprocessor = None
+        self.batchers = {}
+        self._loading = {}
+
+    async def _get_batcher(self, model_filename):
+        if model_filename in self.batchers:
+            return self.batchers[model_filename]
+        if model_filename not in self._loading:
+            self._loading[model_filename] = asyncio.get_running_loop().create_task(self._load(model_filename))
+        return await asyncio.shield(self._loading[model_filename])
+
+    async def _load(self, model_filename):
+        loop = asyncio.get_running_loop()
+        try:
+            with tracing.span("load", model_filename):
+                if self.native:
+                    preprocessor, model = await loop.run_in_executor(
+                        self.executor, native_runtime.load_native_model, model_filename)
+                else:
+                    if self.preprocessor is None:
+                        self.preprocessor = await loop.run_in_executor(self.executor, model_registry.load_preprocessor)
+                    backend = model_registry.get_backend(model_filename)
+                    preprocessor = compile_preprocessor(self.preprocessor, backend_dtype(backend))
+                    model = await loop.run_in_executor(self.executor, model_registry.load_model, model_filename)
+        except Exception:
+            del self._loading[model_filename]
+            raise
+        batcher = MicroBatcher(model_filename, model, preprocessor, self.executor,
+                               self.batch_window_ms, self.max_batch_size)
+        self.batchers[model_filename] = batcher
+        return batcher
+
+    async def preload(self, model_filenames):
+        for model_filename in model_filenames:
+            await self._get_batcher(model_filename)
+
+    def stats(self):
+        return {
+            model_filename: {"batches": batcher.batches, "rows": batcher.rows}
+            for model_filename, batcher in self.batchers.items()
+        }
+
+    async def handle_request(self, method, path, body):
+        if path == "/health":
+            return {"status": "ok"}
+        if path == "/models":
+            return {"models": MODEL_FILES, "loaded": list(self.batchers)}
+        if path == "/stats":
+            return self.stats()
+        if path == "/metrics":
+            return tracing.tracer.to_prometheus()
+        if path == "/metrics.json":
+            return tracing.tracer.snapshot()
+        if not path.startswith("/predict/"):
+            raise HttpError(404, f"Неизвестный путь: {path}")
+        if method != "POST":
+            raise HttpError(405, "Используйте POST")
+
+        model_filename = path[len("/predict/"):]
+        if model_filename not in MODEL_FILES.values():
+            raise HttpError(404, f"Неизвестная модель: {model_filename}")
+        with tracing.span("parse", model_filename):
+            try:
+                payload = json.loads(body or b"null")
+            except ValueError:
+                raise HttpError(400, "Тело запроса должно быть JSON")
+
+        rows = payload if isinstance(payload, list) else [payload]
+        with tracing.span("validate", model_filename, len(rows)):
+            rows = validate_rows(rows)
+
+        try:
+            batcher = await self._get_batcher(model_filename)
+        except FileNotFoundError as e:
+            raise HttpError(404, str(e))
+        # Includes the time spent waiting for the micro-batch window to close
+        with tracing.span("request", model_filename, len(rows)):
+            predictions = await asyncio.gather(*(batcher.submit(row) for row in rows))
+        if isinstance(payload, list):
+            return {"model": model_filename, "predicted_price": predictions}
+        return {"model": model_filename, "predicted_price": predictions[0]}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                body = None
+                try:
+                    length = content_length(headers)
+                    body = await reader.readexactly(length) if length else b""
+                    status, response = 200, await self.handle_request(method, target.split("?")[0], body)
+                except HttpError as e:
+                    status, response = e.status, {"error": str(e)}
+                    # An unread body would be parsed as the next request, so the connection is closed
+                    keep_alive = keep_alive and body is not None
+                except Exception as e:
+                    status, response = 500, {"error": str(e)}
+
+                if isinstance(response, str):
+                    data, content_type = response.encode("utf-8"), PROMETHEUS_CONTENT_TYPE
+                else:
+                    data, content_type = json.dumps(response, ensure_ascii=False).encode("utf-8"), JSON_CONTENT_TYPE
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port, preload=()):
+        await self.preload(preload)
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальный HTTP сервис предсказания цен с микро-батчингом")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--batch-window-ms", type=float, default=DEFAULT_BATCH_WINDOW_MS,
+                        help="Сколько ждать дополнительных запросов перед запуском батча")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--no-batching", action="store_true",
+                        help="Обрабатывать каждую строку отдельным вызовом predict")
+    parser.add_argument("--native", action="store_true",
+                        help="Использовать нативный NumPy артефакт (native_export.py)")
+    parser.add_argument("--preload", nargs="*", default=[],
+                        help="Файлы моделей, загружаемые при старте")
+    args = parser.parse_args(argv)
+
+    if args.no_batching:
+        server = InferenceServer(batch_window_ms=0, max_batch_size=1, native=args.native)
+    else:
+        server = InferenceServer(batch_window_ms=args.batch_window_ms, max_batch_size=args.max_batch_size,
+                                 native=args.native)
+    print(f"Сервис запущен на http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve(args.host, args.port, preload=args.preload))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import model_registry
+import tracing
+
+ENSEMBLE_COLUMN = 'ensemble_price'
+
+
+def prediction_column(model_filename):
+    return f"predicted_price_{os.path.splitext(model_filename)[0]}"
+
+
+class ComparisonResult:
+    def __init__(self, predictions, latencies, ensemble, weights, preprocess_seconds):
+        self.predictions = predictions
+        self.latencies = latencies
+        self.ensemble = ensemble
+        self.weights = weights
+        self.preprocess_seconds = preprocess_seconds
+
+    def to_frame(self):
+        columns = {prediction_column(name): values for name, values in self.predictions.items()}
+        columns[ENSEMBLE_COLUMN] = self.ensemble
+        return pd.DataFrame(columns)
+
+    def summary(self, display_names=None):
+        display_names = display_names or {}
+        rows = []
+        for name, values in self.predictions.items():
+            rows.append({
+                "model": display_names.get(name, name),
+                "weight": self.weights.get(name, 0.0),
+                "predicted_price": float(values[0]) if len(values) == 1 else float(values.mean()),
+                "latency_ms": self.latencies[name] * 1000,
+            })
+        return pd.DataFrame(rows)
+
+
+def ensemble_average(predictions, weights):
+    total = sum(weights.get(name, 0.0) for name in predictions)
+    if total <= 0:
+        raise ValueError("Сумма весов ансамбля должна быть положительной")
+    ensemble = np.zeros(len(next(iter(predictions.values()))), dtype=np.float64)
+    for name, values in predictions.items():
+        weight = weights.get(name, 0.0)
+        if weight:
+            ensemble += weight * values
+    return ensemble / total
+
+
+def _timed_predict(name, model, processed):
+    with tracing.span("predict", name, len(processed)):
+        start = time.perf_counter()
+        predictions = model_registry.predict(model, processed)
+        return predictions, time.perf_counter() - start
+
+
+def compare_models(models, data, preprocessor, weights=None, executor=None):
+    # The preprocessor runs once; every model scores the same matrix on its own thread. The tree
+    # libraries and TensorFlow release the GIL and overlap; the sklearn models (Bagging, polynomial)
+    # hold it for most of predict, so they are effectively serialized with the rest (see BACKEND_POOLS)
+    weights = weights if weights is not None else {name: 1.0 for name in models}
+
+    with tracing.span("transform", "comparison") as transform_span:
+        start = time.perf_counter()
+        processed = preprocessor.transform(data)
+        preprocess_seconds = time.perf_counter() - start
+        transform_span.rows = len(processed)
+
+    own_executor = executor is None
+    executor = executor or ThreadPoolExecutor(max_workers=max(1, len(models)))
+    try:
+        futures = {name: executor.submit(_timed_predict, name, model, processed) for name, model in models.items()}
+        results = {name: future.result() for name, future in futures.items()}
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False)
+
+    predictions = {name: values for name, (values, _) in results.items()}
+    latencies = {name: seconds for name, (_, seconds) in results.items()}
+    ensemble = ensemble_average(predictions, weights)
+    return ComparisonResult(predictions, latencies, ensemble, weights, preprocess_seconds)
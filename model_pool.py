@@ -0,0 +1,174 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import model_registry
+from model_registry import MODEL_FILES
+
+DEFAULT_BUDGET_MB = 256
+BUDGET_ENV = 'DIAMONDS_MODEL_BUDGET_MB'
+PRELOAD_ENV = 'DIAMONDS_PRELOAD_MODELS'
+
+
+def estimate_model_bytes(model):
+    # A proxy, not the real footprint: the pickled size for most models and the weight tensors for Keras.
+    # Native XGBoost/LightGBM/CatBoost boosters and the TensorFlow graph allocate outside Python and are
+    # not measured, so the budget bounds the relative weight of the pool rather than the process RSS
+    if type(model).__module__.split('.')[0] in ("keras", "tensorflow"):
+        return int(sum(weights.nbytes for weights in model.get_weights()))
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def budget_from_env():
+    return int(float(os.environ.get(BUDGET_ENV, DEFAULT_BUDGET_MB)) * 1024 * 1024)
+
+
+def preload_from_env():
+    # Opt-in: preloading imports every framework at startup, which is exactly what lazy backend imports avoid.
+    # Unset or empty: nothing; "all": every model whose file exists; otherwise comma-separated files
+    value = os.environ.get(PRELOAD_ENV, "").strip()
+    if value == "all":
+        return [name for name in MODEL_FILES.values() if os.path.exists(model_registry.model_path(name))]
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class PoolEntry:
+    def __init__(self, model, size_bytes, load_seconds, signature=None):
+        self.model = model
+        self.signature = signature
+        self.size_bytes = size_bytes
+        self.load_seconds = load_seconds
+        self.uses = 0
+        self.last_used = None
+
+
+class ModelPool:
+    # Process-wide model store shared by all sessions. Entries are kept in least-recently-used
+    # order and evicted once their estimated footprint (see estimate_model_bytes) exceeds the
+    # budget from DIAMONDS_MODEL_BUDGET_MB; the model that was just requested is never evicted,
+    # so a single oversized model still works.
+    def __init__(self, budget_bytes=None, loader=model_registry.load_model):
+        self.budget_bytes = budget_from_env() if budget_bytes is None else budget_bytes
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.errors = {}
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_history = {}
+        self.preload_thread = None
+        self.preload_pending = []
+
+    def get(self, model_filename, use=True):
+        # use=False is a warm-up load: it is not counted as a use and the model goes to the
+        # least-recently-used end, so preloaded models are the first to make room for real traffic
+        signature = model_registry.artifact_signature(model_filename)
+        with self._lock:
+            entry = self._entries.get(model_filename)
+            if entry is not None and entry.signature != signature:
+                # The file was replaced (e.g. a promoted training run): drop the stale model
+                del self._entries[model_filename]
+                entry = None
+            if entry is not None:
+                return self._touch(model_filename, entry, use)
+            load_lock = self._load_locks.setdefault(model_filename, threading.Lock())
+
+        # Concurrent requests for the same model (e.g. a user and the preloader) wait for one load
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(model_filename)
+                if entry is not None and entry.signature == signature:
+                    return self._touch(model_filename, entry, use)
+            entry = self._load(model_filename, signature)
+            with self._lock:
+                self._entries[model_filename] = entry
+                if use:
+                    self._touch(model_filename, entry, use)
+                else:
+                    self._entries.move_to_end(model_filename, last=False)
+                # A warm-up load that does not fit is dropped again instead of displacing used models
+                self._evict(keep=model_filename if use else None)
+        return entry.model
+
+    def _touch(self, model_filename, entry, use):
+        if use:
+            self.hits += 1
+            entry.uses += 1
+            entry.last_used = time.time()
+            self._entries.move_to_end(model_filename)
+        return entry.model
+
+    def _load(self, model_filename, signature=None):
+        start = time.perf_counter()
+        try:
+            model = self.loader(model_filename)
+        except Exception as e:
+            self.errors[model_filename] = str(e)
+            raise
+        load_seconds = time.perf_counter() - start
+        entry = PoolEntry(model, estimate_model_bytes(model), load_seconds, signature)
+        with self._lock:
+            self.errors.pop(model_filename, None)
+            self.loads += 1
+            self.load_history.setdefault(model_filename, []).append(load_seconds)
+        return entry
+
+    def _evict(self, keep=None):
+        while self.resident_bytes() > self.budget_bytes:
+            victim = next((name for name in self._entries if name != keep), None)
+            if victim is None:
+                break
+            del self._entries[victim]
+            self.evictions += 1
+
+    def resident_bytes(self):
+        return sum(entry.size_bytes for entry in self._entries.values())
+
+    def _preload(self, model_filenames):
+        for model_filename in model_filenames:
+            # Warming up must not push out models that users are already working with
+            if self.resident_bytes() >= self.budget_bytes:
+                break
+            try:
+                self.get(model_filename, use=False)
+            except Exception:
+                pass  # kept in self.errors and raised again when a user selects the model
+            self.preload_pending.remove(model_filename)
+        self.preload_pending = []
+
+    def start_preload(self, model_filenames=None):
+        model_filenames = preload_from_env() if model_filenames is None else list(model_filenames)
+        self.preload_pending = list(model_filenames)
+        if not model_filenames:
+            return None
+        self.preload_thread = threading.Thread(target=self._preload, args=(model_filenames,),
+                                               name="model-pool-preload", daemon=True)
+        self.preload_thread.start()
+        return self.preload_thread
+
+    def stats(self):
+        with self._lock:
+            models = {
+                name: {
+                    "size_bytes": entry.size_bytes,
+                    "load_seconds": entry.load_seconds,
+                    "uses": entry.uses,
+                    "last_used": entry.last_used,
+                }
+                for name, entry in self._entries.items()
+            }
+            return {
+                "budget_bytes": self.budget_bytes,
+                "resident_bytes": self.resident_bytes(),
+                "models": models,
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+                "load_seconds": {name: list(times) for name, times in self.load_history.items()},
+                "errors": dict(self.errors),
+                "preload_pending": list(self.preload_pending),
+            }
@@ -0,0 +1,131 @@
+import hashlib
+import importlib
+import json
+import os
+import sys
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+PREPROCESSOR_FILE = 'mlp_preprocessor.pkl'
+# Written by train.py next to the artifacts it produced
+MANIFEST_FILE = 'manifest.json'
+
+FEATURE_COLUMNS = ['carat', 'cut', 'color', 'clarity', 'depth', 'table', 'x', 'y', 'z']
+
+MODEL_FILES = {
+    "Нейронная сеть (MLP)": "mlp.h5",
+    "XGBoost": "xgboost.pkl",
+    "CatBoost": "catboost.pkl",
+    "LightGBM": "lightgbm.pkl",
+    "Bagging Regressor": "baggingregressor.pkl",
+    "Polynomial Regression": "polinomialreg.pkl"
+}
+
+MODEL_BACKENDS = {
+    "mlp.h5": "keras",
+    "xgboost.pkl": "xgboost",
+    "catboost.pkl": "catboost",
+    "lightgbm.pkl": "lightgbm",
+    "baggingregressor.pkl": "sklearn",
+    "polinomialreg.pkl": "sklearn"
+}
+
+# Framework that has to be importable before a model of the given backend can be loaded
+BACKEND_MODULES = {
+    "keras": "tensorflow",
+    "xgboost": "xgboost",
+    "catboost": "catboost",
+    "lightgbm": "lightgbm",
+    "sklearn": "sklearn"
+}
+
+
+def model_path(model_filename):
+    return os.path.join(MODELS_DIR, model_filename)
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_signature(filename):
+    # Changes whenever train.py promotes a new version of the file
+    try:
+        stat = os.stat(model_path(filename))
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_backend(model_filename):
+    backend = MODEL_BACKENDS.get(model_filename)
+    if backend is not None:
+        return backend
+    if model_filename.endswith('.h5'):
+        return "keras"
+    if model_filename.endswith('.pkl'):
+        return "sklearn"
+    raise ValueError(f"Неизвестный формат файла модели: {model_filename}")
+
+
+def import_backend(backend):
+    return importlib.import_module(BACKEND_MODULES[backend])
+
+
+def loaded_backends():
+    return [backend for backend, module in BACKEND_MODULES.items() if module in sys.modules]
+
+
+def load_preprocessor():
+    import joblib
+
+    preprocessor_path = model_path(PREPROCESSOR_FILE)
+    if not os.path.exists(preprocessor_path):
+        raise FileNotFoundError(f"Файл препроцессора не найден: {preprocessor_path}")
+    return joblib.load(preprocessor_path)
+
+
+def library_versions():
+    # Recorded next to training manifests and benchmark results, which are only comparable on the same versions
+    import importlib.metadata
+
+    versions = {}
+    for package in ("numpy", "scikit-learn", "xgboost", "lightgbm", "catboost", "tensorflow", "tensorflow-cpu", "keras"):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            pass
+    return versions
+
+
+def load_manifest():
+    path = model_path(MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_model(model_filename):
+    path = model_path(model_filename)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Файл модели не найден: {path}")
+
+    backend = get_backend(model_filename)
+    framework = import_backend(backend)
+    if backend == "keras":
+        return framework.keras.models.load_model(path)
+
+    import joblib
+    return joblib.load(path)
+
+
+def predict(model, processed_input):
+    if type(model).__module__.split('.')[0] in ("keras", "tensorflow"):
+        predictions = model.predict(processed_input, verbose=0)
+    else:
+        predictions = model.predict(processed_input)
+    return predictions.reshape(-1)
@@ -0,0 +1,290 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+import model_registry
+from model_registry import MODEL_FILES, PREPROCESSOR_FILE, file_digest, model_path
+from fast_preprocess import CompiledPreprocessor
+from native_runtime import (DenseNetwork, NativeArtifact, ObliviousEnsemble, QuadraticModel, TreeEnsemble,
+                            artifact_path, save_artifact)
+
+
+class _NodeBuilder:
+    # Accumulates trees into the flat node arrays used by TreeEnsemble
+    def __init__(self):
+        self.roots, self.feature, self.threshold = [], [], []
+        self.left, self.right, self.default_left, self.value = [], [], [], []
+        self.depth = 0
+
+    def add_tree(self, feature, threshold, left, right, default_left, value, is_leaf):
+        offset = len(self.feature)
+        n_nodes = len(feature)
+        node_ids = np.arange(n_nodes) + offset
+        left = np.where(is_leaf, node_ids, np.asarray(left) + offset)
+        right = np.where(is_leaf, node_ids, np.asarray(right) + offset)
+
+        self.roots.append(offset)
+        self.feature.extend(np.where(is_leaf, 0, feature))
+        self.threshold.extend(np.where(is_leaf, 0, threshold))
+        self.left.extend(left)
+        self.right.extend(right)
+        self.default_left.extend(default_left)
+        self.value.extend(np.where(is_leaf, value, 0.0))
+        self.depth = max(self.depth, _tree_depth(left - offset, right - offset, is_leaf))
+
+    def build(self, **kwargs):
+        return TreeEnsemble(self.roots, self.feature, self.threshold, self.left, self.right,
+                            self.default_left, self.value, self.depth, **kwargs)
+
+
+def _tree_depth(left, right, is_leaf):
+    depth = np.zeros(len(left), dtype=np.int64)
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        if not is_leaf[node]:
+            for child in (left[node], right[node]):
+                depth[child] = depth[node] + 1
+                stack.append(child)
+    return int(depth.max())
+
+
+def export_xgboost(model):
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw(raw_format='json'))['learner']
+    objective = learner['objective']['name']
+    if objective != 'reg:squarederror':
+        raise NotImplementedError(f"Неподдерживаемая целевая функция XGBoost: {objective}")
+    base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+
+    trees = learner['gradient_booster']['model']['trees']
+    # An early-stopped model keeps the trees past the best iteration, but predict() ignores them
+    best_iteration = getattr(model, 'best_iteration', None)
+    if best_iteration is not None:
+        trees = trees[:best_iteration + 1]
+
+    builder = _NodeBuilder()
+    for tree in trees:
+        left = np.asarray(tree['left_children'])
+        is_leaf = left == -1
+        builder.add_tree(tree['split_indices'], np.float32(tree['split_conditions']), left,
+                         tree['right_children'], np.asarray(tree['default_left'], dtype=bool),
+                         tree['split_conditions'], is_leaf)
+    return builder.build(decision='lt', input_dtype='float32', threshold_dtype='float32', base=base_score)
+
+
+def export_lightgbm(model):
+    dump = model.booster_.dump_model()
+    if dump['objective'].split()[0] != 'regression' or dump['num_tree_per_iteration'] != 1:
+        raise NotImplementedError(f"Неподдерживаемая целевая функция LightGBM: {dump['objective']}")
+
+    builder = _NodeBuilder()
+    for info in dump['tree_info']:
+        feature, threshold, left, right, default_left, value, is_leaf = [], [], [], [], [], [], []
+
+        def visit(node):
+            index = len(feature)
+            for column in (feature, threshold, left, right, default_left, value, is_leaf):
+                column.append(0)
+            if 'leaf_value' in node:
+                value[index] = node['leaf_value']
+                is_leaf[index] = True
+                return index
+            if node['decision_type'] != '<=':
+                raise NotImplementedError("Категориальные разбиения LightGBM не поддерживаются")
+            feature[index] = node['split_feature']
+            threshold[index] = node['threshold']
+            default_left[index] = node['default_left']
+            left[index] = visit(node['left_child'])
+            right[index] = visit(node['right_child'])
+            return index
+
+        visit(info['tree_structure'])
+        builder.add_tree(feature, threshold, left, right, np.asarray(default_left, dtype=bool),
+                         value, np.asarray(is_leaf, dtype=bool))
+    scale = 1.0 / len(dump['tree_info']) if dump['average_output'] else 1.0
+    return builder.build(decision='le', input_dtype='float64', scale=scale)
+
+
+def export_catboost(model):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'model.json')
+        model.save_model(path, format='json')
+        with open(path, encoding='utf-8') as f:
+            dump = json.load(f)
+
+    float_features = dump['features_info'].get('float_features', [])
+    if dump['features_info'].get('categorical_features'):
+        raise NotImplementedError("Категориальные признаки CatBoost не поддерживаются")
+    flat_index = {feature['feature_index']: feature['flat_feature_index'] for feature in float_features}
+
+    trees = dump['oblivious_trees']
+    depth = max(len(tree['splits']) for tree in trees)
+    split_feature = np.zeros((len(trees), depth), dtype=np.int32)
+    split_border = np.full((len(trees), depth), np.inf, dtype=np.float32)
+    leaf_values = np.zeros((len(trees), 1 << depth), dtype=np.float64)
+    for i, tree in enumerate(trees):
+        for j, split in enumerate(tree['splits']):
+            if split['split_type'] != 'FloatFeature':
+                raise NotImplementedError(f"Неподдерживаемый тип разбиения CatBoost: {split['split_type']}")
+            split_feature[i, j] = flat_index[split['float_feature_index']]
+            split_border[i, j] = split['border']
+        leaf_values[i, :len(tree['leaf_values'])] = tree['leaf_values']
+
+    scale, bias = dump.get('scale_and_bias', [1.0, [0.0]])
+    return ObliviousEnsemble(split_feature, split_border, leaf_values, scale=scale, bias=bias[0])
+
+
+def export_bagging(model):
+    estimators = model.estimators_
+    if not all(type(estimator).__name__ == 'DecisionTreeRegressor' for estimator in estimators):
+        raise NotImplementedError("Поддерживается только BaggingRegressor из DecisionTreeRegressor")
+
+    builder = _NodeBuilder()
+    for estimator, features in zip(estimators, model.estimators_features_):
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        builder.add_tree(np.asarray(features)[np.maximum(tree.feature, 0)], tree.threshold,
+                         tree.children_left, tree.children_right, np.zeros(tree.node_count, dtype=bool),
+                         tree.value[:, 0, 0], is_leaf)
+    return builder.build(decision='le', input_dtype='float32', scale=1.0 / len(estimators))
+
+
+def export_polynomial(pipeline):
+    steps = dict(pipeline.steps)
+    poly = next(step for step in steps.values() if type(step).__name__ == 'PolynomialFeatures')
+    linear_model = pipeline.steps[-1][1]
+    if poly.powers_.sum(axis=1).max() > 2:
+        raise NotImplementedError("Поддерживаются только полиномы степени не выше 2")
+
+    n_features = poly.n_features_in_
+    coef = np.ravel(linear_model.coef_)
+    intercept = float(np.ravel(linear_model.intercept_)[0]) if np.ndim(linear_model.intercept_) else float(linear_model.intercept_)
+    linear = np.zeros(n_features)
+    quadratic = np.zeros((n_features, n_features))
+    for powers, c in zip(poly.powers_, coef):
+        involved = np.flatnonzero(powers)
+        if len(involved) == 0:
+            intercept += c
+        elif powers.sum() == 1:
+            linear[involved[0]] += c
+        elif len(involved) == 1:
+            quadratic[involved[0], involved[0]] += c
+        else:
+            quadratic[involved[0], involved[1]] += c
+    return QuadraticModel(intercept, linear, quadratic)
+
+
+def export_keras_h5(path):
+    import h5py
+
+    with h5py.File(path, 'r') as f:
+        config = json.loads(f.attrs['model_config'])
+        weights_group = f['model_weights'] if 'model_weights' in f else f
+
+        def layer_weights(name):
+            group = weights_group[name]
+            arrays = {}
+            group.visititems(lambda key, item: arrays.__setitem__(key.split('/')[-1].split(':')[0], item[()])
+                             if hasattr(item, 'shape') else None)
+            return arrays
+
+        weights, biases, activations = [], [], []
+        # Affine transform (x * scale + shift) still waiting to be folded into the next Dense layer
+        pending_scale, pending_shift = None, None
+        for layer in config['config']['layers']:
+            kind, layer_config = layer['class_name'], layer['config']
+            if kind in ('InputLayer', 'Dropout'):
+                continue
+            arrays = layer_weights(layer_config['name'])
+            if kind == 'Dense':
+                w = arrays['kernel'].astype(np.float64)
+                b = arrays['bias'].astype(np.float64) if layer_config.get('use_bias', True) else np.zeros(w.shape[1])
+                if pending_scale is not None:
+                    b = b + pending_shift @ w
+                    w = w * pending_scale[:, None]
+                    pending_scale, pending_shift = None, None
+                weights.append(w)
+                biases.append(b)
+                activations.append(layer_config.get('activation', 'linear'))
+            elif kind == 'BatchNormalization':
+                gamma = arrays.get('gamma', 1.0)
+                beta = arrays.get('beta', 0.0)
+                scale = gamma / np.sqrt(arrays['moving_variance'] + layer_config['epsilon'])
+                shift = beta - arrays['moving_mean'] * scale
+                if pending_scale is not None:
+                    shift = pending_shift * scale + shift
+                    scale = pending_scale * scale
+                pending_scale, pending_shift = scale.astype(np.float64), shift.astype(np.float64)
+            else:
+                raise NotImplementedError(f"Неподдерживаемый слой Keras: {kind}")
+
+    if pending_scale is not None:
+        # Trailing normalization: append it as an identity-activated diagonal layer
+        weights.append(np.diag(pending_scale))
+        biases.append(pending_shift)
+        activations.append('linear')
+    return DenseNetwork(weights, biases, activations)
+
+
+EXPORTERS = {
+    'XGBRegressor': export_xgboost,
+    'LGBMRegressor': export_lightgbm,
+    'CatBoostRegressor': export_catboost,
+    'BaggingRegressor': export_bagging,
+    'Pipeline': export_polynomial,
+}
+
+
+def export_model(model_filename):
+    path = model_path(model_filename)
+    if model_registry.get_backend(model_filename) == 'keras':
+        return export_keras_h5(path)
+    model = model_registry.load_model(model_filename)
+    exporter = EXPORTERS.get(type(model).__name__)
+    if exporter is None:
+        raise NotImplementedError(f"Экспорт модели {type(model).__name__} не поддерживается")
+    return exporter(model)
+
+
+def export_all(model_filenames=None, path=None):
+    model_filenames = model_filenames or list(MODEL_FILES.values())
+    # The native models are evaluated on float64 features, exactly as produced by sklearn
+    preprocessor = CompiledPreprocessor.from_sklearn(model_registry.load_preprocessor(), dtype=np.float64)
+    sources = {'preprocessor': file_digest(model_path(PREPROCESSOR_FILE))}
+    models, skipped = {}, {}
+    for model_filename in model_filenames:
+        if not os.path.exists(model_path(model_filename)):
+            skipped[model_filename] = "файл модели не найден"
+            continue
+        try:
+            models[model_filename] = export_model(model_filename)
+        except NotImplementedError as e:
+            skipped[model_filename] = str(e)
+            continue
+        sources[model_filename] = file_digest(model_path(model_filename))
+    saved_path = save_artifact(NativeArtifact(preprocessor, models, sources), path)
+    return saved_path, list(models), skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Экспорт моделей и препроцессора в нативный NumPy артефакт")
+    parser.add_argument("--models", nargs="*", help="Файлы моделей (по умолчанию все из MODEL_FILES)")
+    parser.add_argument("--output", default=artifact_path())
+    args = parser.parse_args(argv)
+
+    saved_path, exported, skipped = export_all(args.models, args.output)
+    for model_filename in exported:
+        print(f"{model_filename}: экспортирована")
+    for model_filename, reason in skipped.items():
+        print(f"{model_filename}: пропущена ({reason})")
+    print(f"Артефакт сохранён: {saved_path} ({os.path.getsize(saved_path) / 1024:.0f} КБ)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+import json
+import os
+
+import numpy as np
+
+from fast_preprocess import CompiledPreprocessor
+from model_registry import FEATURE_COLUMNS, PREPROCESSOR_FILE, file_digest, model_path
+
+ARTIFACT_FILE = 'native_models.npz'
+FORMAT_VERSION = 1
+
+_MANIFEST_KEY = '__manifest__'
+
+# Upper bound on the size of the per-block (rows x trees [x depth]) work arrays
+_BLOCK_ELEMENTS = 1 << 22
+
+ACTIVATIONS = {
+    'linear': lambda h: h,
+    'relu': lambda h: np.maximum(h, 0, out=h),
+    'sigmoid': lambda h: 1.0 / (1.0 + np.exp(-h)),
+    'tanh': np.tanh,
+}
+
+
+def _row_blocks(n_rows, elements_per_row):
+    block = max(1, _BLOCK_ELEMENTS // max(1, elements_per_row))
+    for start in range(0, n_rows, block):
+        yield start, min(start + block, n_rows)
+
+
+class TreeEnsemble:
+    # Binary decision trees flattened into node arrays; leaves point to themselves so every
+    # tree can be advanced the same number of steps. Used for XGBoost, LightGBM and the
+    # DecisionTreeRegressor estimators of the Bagging model. Inputs are rounded to the
+    # precision the library evaluates them in before being compared with the thresholds.
+    kind = 'tree_ensemble'
+
+    def __init__(self, roots, feature, threshold, left, right, default_left, value,
+                 depth, decision='le', input_dtype='float64', threshold_dtype='float64', scale=1.0, base=0.0):
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=threshold_dtype)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.depth = int(depth)
+        self.decision = decision
+        self.input_dtype = input_dtype
+        self.threshold_dtype = threshold_dtype
+        self.scale = float(scale)
+        self.base = float(base)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=self.input_dtype)
+        out = np.empty(len(X), dtype=np.float64)
+        for start, stop in _row_blocks(len(X), len(self.roots)):
+            block = X[start:stop]
+            node = np.broadcast_to(self.roots, (len(block), len(self.roots))).copy()
+            for _ in range(self.depth):
+                x = np.take_along_axis(block, self.feature[node], axis=1)
+                threshold = self.threshold[node]
+                go_left = x < threshold if self.decision == 'lt' else x <= threshold
+                go_left |= np.isnan(x) & self.default_left[node]
+                node = np.where(go_left, self.left[node], self.right[node])
+            out[start:stop] = self.value[node].sum(axis=1)
+        return out * self.scale + self.base
+
+    def to_arrays(self):
+        spec = {'depth': self.depth, 'decision': self.decision, 'input_dtype': self.input_dtype,
+                'threshold_dtype': self.threshold_dtype, 'scale': self.scale, 'base': self.base}
+        arrays = {name: getattr(self, name)
+                  for name in ('roots', 'feature', 'threshold', 'left', 'right', 'default_left', 'value')}
+        return spec, arrays
+
+    @classmethod
+    def from_arrays(cls, spec, arrays):
+        return cls(depth=spec['depth'], decision=spec['decision'], input_dtype=spec['input_dtype'],
+                   threshold_dtype=spec['threshold_dtype'], scale=spec['scale'], base=spec['base'], **arrays)
+
+
+class ObliviousEnsemble:
+    # CatBoost symmetric trees: every level of a tree uses one (feature, border) split and the
+    # leaf index is the bit pattern of the level outcomes. Shallower trees are padded with
+    # borders that never fire.
+    kind = 'oblivious_ensemble'
+
+    def __init__(self, split_feature, split_border, leaf_values, scale=1.0, bias=0.0):
+        self.split_feature = np.asarray(split_feature, dtype=np.int32)
+        self.split_border = np.asarray(split_border, dtype=np.float32)
+        self.leaf_values = np.asarray(leaf_values, dtype=np.float64)
+        self.scale = float(scale)
+        self.bias = float(bias)
+        self._powers = (1 << np.arange(self.split_feature.shape[1])).astype(np.int32)
+        self._tree_index = np.arange(len(self.split_feature))
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        n_trees, depth = self.split_feature.shape
+        out = np.empty(len(X), dtype=np.float64)
+        for start, stop in _row_blocks(len(X), n_trees * depth):
+            bits = X[start:stop][:, self.split_feature] > self.split_border
+            leaf = bits.astype(np.int32) @ self._powers
+            out[start:stop] = self.leaf_values[self._tree_index, leaf].sum(axis=1)
+        return out * self.scale + self.bias
+
+    def to_arrays(self):
+        return ({'scale': self.scale, 'bias': self.bias},
+                {'split_feature': self.split_feature, 'split_border': self.split_border,
+                 'leaf_values': self.leaf_values})
+
+    @classmethod
+    def from_arrays(cls, spec, arrays):
+        return cls(scale=spec['scale'], bias=spec['bias'], **arrays)
+
+
+class DenseNetwork:
+    # Feed-forward network of Dense layers; inference-time BatchNormalization is folded into
+    # the weights at export and Dropout is dropped
+    kind = 'dense_network'
+
+    def __init__(self, weights, biases, activations):
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+        for activation in self.activations:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Неподдерживаемая функция активации: {activation}")
+
+    def predict(self, X):
+        h = np.asarray(X, dtype=np.float32)
+        for w, b, activation in zip(self.weights, self.biases, self.activations):
+            h = h @ w
+            h += b
+            h = ACTIVATIONS[activation](h)
+        return h.reshape(-1).astype(np.float64)
+
+    def to_arrays(self):
+        arrays = {}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f'w{i}'] = w
+            arrays[f'b{i}'] = b
+        return {'activations': self.activations}, arrays
+
+    @classmethod
+    def from_arrays(cls, spec, arrays):
+        n_layers = len(spec['activations'])
+        return cls([arrays[f'w{i}'] for i in range(n_layers)],
+                   [arrays[f'b{i}'] for i in range(n_layers)],
+                   spec['activations'])
+
+
+class QuadraticModel:
+    # Degree-2 PolynomialFeatures followed by a linear model, evaluated as
+    # intercept + X @ linear + sum((X @ quadratic) * X) without materializing the expansion
+    kind = 'quadratic'
+
+    def __init__(self, intercept, linear, quadratic):
+        self.intercept = float(intercept)
+        self.linear = np.asarray(linear, dtype=np.float64)
+        self.quadratic = np.asarray(quadratic, dtype=np.float64)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        return self.intercept + X @ self.linear + np.einsum('ij,ij->i', X @ self.quadratic, X)
+
+    def to_arrays(self):
+        return {'intercept': self.intercept}, {'linear': self.linear, 'quadratic': self.quadratic}
+
+    @classmethod
+    def from_arrays(cls, spec, arrays):
+        return cls(spec['intercept'], **arrays)
+
+
+MODEL_KINDS = {cls.kind: cls for cls in (TreeEnsemble, ObliviousEnsemble, DenseNetwork, QuadraticModel)}
+
+
+class NativeArtifact:
+    def __init__(self, preprocessor, models, sources=None):
+        self.preprocessor = preprocessor
+        self.models = models
+        self.sources = sources or {}
+
+    def predict(self, model_filename, data):
+        return self.models[model_filename].predict(self.preprocessor.transform(data))
+
+
+def artifact_path():
+    return model_path(ARTIFACT_FILE)
+
+
+def save_artifact(artifact, path=None):
+    path = path or artifact_path()
+    arrays = {}
+    pre_spec, pre_arrays = artifact.preprocessor.to_arrays()
+    arrays.update({f'preprocessor/{name}': value for name, value in pre_arrays.items()})
+
+    manifest = {'format_version': FORMAT_VERSION, 'feature_columns': FEATURE_COLUMNS,
+                'preprocessor': pre_spec, 'models': {}}
+    for model_filename, model in artifact.models.items():
+        spec, model_arrays = model.to_arrays()
+        manifest['models'][model_filename] = {'kind': model.kind, 'spec': spec,
+                                              'source_sha256': artifact.sources.get(model_filename)}
+        arrays.update({f'{model_filename}/{name}': value for name, value in model_arrays.items()})
+    manifest['preprocessor_sha256'] = artifact.sources.get('preprocessor')
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays, **{_MANIFEST_KEY: np.array(json.dumps(manifest))})
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_artifact(path=None):
+    path = path or artifact_path()
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Нативный артефакт не найден: {path}. Запустите native_export.py")
+    with np.load(path, allow_pickle=False) as data:
+        manifest = json.loads(str(data[_MANIFEST_KEY]))
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия артефакта: {manifest.get('format_version')}")
+
+        def arrays_with_prefix(prefix):
+            return {key[len(prefix):]: data[key] for key in data.files if key.startswith(prefix)}
+
+        preprocessor = CompiledPreprocessor.from_arrays(manifest['preprocessor'],
+                                                      arrays_with_prefix('preprocessor/'))
+        models = {}
+        sources = {'preprocessor': manifest.get('preprocessor_sha256')}
+        for model_filename, entry in manifest['models'].items():
+            model_cls = MODEL_KINDS[entry['kind']]
+            models[model_filename] = model_cls.from_arrays(entry['spec'],
+                                                           arrays_with_prefix(f'{model_filename}/'))
+            sources[model_filename] = entry.get('source_sha256')
+    return NativeArtifact(preprocessor, models, sources)
+
+
+_loaded_artifacts = {}
+
+
+def check_sources(artifact, model_filename):
+    # The artifact is a snapshot of the files it was exported from; after train.py --promote it is stale.
+    # Deployments that ship only the artifact have no source files to compare against.
+    for source, filename in (('preprocessor', PREPROCESSOR_FILE), (model_filename, model_filename)):
+        expected = artifact.sources.get(source)
+        path = model_path(filename)
+        if expected is not None and os.path.exists(path) and file_digest(path) != expected:
+            raise ValueError(f"Нативный артефакт устарел: {filename} изменился после экспорта. "
+                             f"Запустите native_export.py")
+
+
+def load_native_model(model_filename, path=None):
+    # The artifact is read once per process and shared by all callers
+    path = path or artifact_path()
+    artifact = _loaded_artifacts.get(path)
+    if artifact is None:
+        artifact = _loaded_artifacts[path] = load_artifact(path)
+    if model_filename not in artifact.models:
+        raise FileNotFoundError(f"Модель {model_filename} отсутствует в нативном артефакте {path}")
+    check_sources(artifact, model_filename)
+    return artifact.preprocessor, artifact.models[model_filename]
@@ -1,5 +1,6 @@
 import streamlit as st
-import pandas as pd
+
+import dataset
 
 def show_page():
     st.title("Анализ датасета бриллиантов")
@@ -10,24 +11,14 @@ def show_page():
     """)
 
     try:
-        df = pd.read_csv('post_diamonds.csv')
-        
-        df['table'] = df['table'].astype(int)
-        
-        dict_cut = {1: 'Fair', 2: 'Good', 3: 'Very Good', 4: 'Premium', 5: 'Ideal'}
-        dict_color = {1: 'J', 2: 'I', 3: 'H', 4: 'G', 5: 'F', 6: 'E', 7: 'D'}
-        dict_clarity = {1: 'I1', 2: 'SI2', 3: 'SI1', 4: 'VS2', 5: 'VS1', 6: 'VVS2', 7: 'VVS1', 8: 'IF'}
-        
-        df['cut'] = df['cut'].map(dict_cut)
-        df['color'] = df['color'].map(dict_color)
-        df['clarity'] = df['clarity'].map(dict_clarity)
+        diamonds = dataset.load_dataset()
         
         st.header("Предпросмотр данных")
-        st.dataframe(df.head())
+        st.dataframe(diamonds.head())
         
     except Exception as e:
         st.error(f"Ошибка при загрузке данных: {e}")
-        df = None
+        diamonds = None
 
     st.header("Структура датасета")
 
@@ -56,10 +47,11 @@ def show_page():
 
     st.write(f"Количество признаков: {len(data_description)-1}")
 
-    if df is not None:
-        st.write(f"Количество записей: {len(df)}")
-        st.write(f"Диапазон цен: ${df['price'].min():,} - ${df['price'].max():,}")
-        st.write(f"Средний вес: {df['carat'].mean():.2f} карат")
+    if diamonds is not None:
+        stats = diamonds.stats
+        st.write(f"Количество записей: {stats['rows']}")
+        st.write(f"Диапазон цен: ${stats['price']['min']:,} - ${stats['price']['max']:,}")
+        st.write(f"Средний вес: {stats['carat']['mean']:.2f} карат")
 
     st.markdown("---")
 
@@ -67,31 +59,31 @@ def show_page():
     st.markdown("""
     **Преобразование категориальных признаков:**
 
-    - Признак `cut` (качество огранки) закодирован численно:
-      - 1: Fair
-      - 2: Good
-      - 3: Very Good
-      - 4: Premium
-      - 5: Ideal
-
-    - Признак `color` (цвет) закодирован численно от 1 до 7:
-      - 1: J (наименее ценный)
-      - 2: I
-      - 3: H
-      - 4: G
-      - 5: F
-      - 6: E
-      - 7: D (наиболее ценный)
-
-    - Признак `clarity` (чистота) закодирован численно от 1 до 8:
-      - 1: I1 (наименьшая чистота)
-      - 2: SI2
-      - 3: SI1
+    - Признак `cut` (качество огранки) закодирован численно от 0 до 4:
+      - 0: Ideal (наилучшая огранка)
+      - 1: Premium
+      - 2: Very Good
+      - 3: Good
+      - 4: Fair
+
+    - Признак `color` (цвет) закодирован численно от 0 до 6:
+      - 0: D (наиболее ценный)
+      - 1: E
+      - 2: F
+      - 3: G
+      - 4: H
+      - 5: I
+      - 6: J (наименее ценный)
+
+    - Признак `clarity` (чистота) закодирован численно от 0 до 7:
+      - 0: IF (наивысшая чистота)
+      - 1: VVS1
+      - 2: VVS2
+      - 3: VS1
       - 4: VS2
-      - 5: VS1
-      - 6: VVS2
-      - 7: VVS1
-      - 8: IF (наивысшая чистота)
+      - 5: SI1
+      - 6: SI2
+      - 7: I1 (наименьшая чистота)
 
     **Преобразование типов данных:**
     - Столбец `table` преобразован из float64 в int64
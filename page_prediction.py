@@ -1,88 +1,259 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-import joblib
-import tensorflow as tf
-import os
 
-if 'model' not in st.session_state:
-    st.session_state.model = None
+import model_registry
+from batch_results import (EXPORT_FORMATS, PREVIEW_ROWS, export_bytes, frame_for_valid_rows, parquet_available,
+                           score_valid_rows)
+from batch_score import PREDICTION_COLUMN
+from explain import BASE_COLUMN, HIGH_COLUMN, LOW_COLUMN, Explainer, contribution_column
+from fast_preprocess import backend_dtype, compile_preprocessor
+from model_comparison import compare_models
+from model_pool import ModelPool
+from model_registry import FEATURE_COLUMNS, MODEL_FILES
+from prediction_cache import PredictionCache
+from scoring_engine import ScoringEngine
+from schema import CATEGORY_CODES
+import schema
+import tracing
+
 if 'preprocessor' not in st.session_state:
     st.session_state.preprocessor = None
 
-MODEL_FILES = {
-    "Нейронная сеть (MLP)": "mlp.h5",
-    "XGBoost": "xgboost.pkl",
-    "CatBoost": "catboost.pkl",
-    "LightGBM": "lightgbm.pkl",
-    "Bagging Regressor": "baggingregressor.pkl",
-    "Polynomial Regression": "polinomialreg.pkl"
-}
-
-@st.cache_resource
-def load_preprocessor():
-    preprocessor_path = os.path.join('models', 'mlp_preprocessor.pkl')
+# Keyed on the file signature so that a newly promoted preprocessor replaces the cached one
+@st.cache_resource(max_entries=1)
+def load_preprocessor(signature):
     loaded_preprocessor = None
-    if os.path.exists(preprocessor_path):
-        try:
-            loaded_preprocessor = joblib.load(preprocessor_path)
-            st.sidebar.success("Препроцессор (mlp_preprocessor.pkl) успешно загружен.")
-        except Exception as e:
-            st.sidebar.error(f"Ошибка загрузки препроцессора: {str(e)}")
-    else:
-        st.sidebar.error(f"Файл препроцессора не найден: {preprocessor_path}")
+    try:
+        loaded_preprocessor = model_registry.load_preprocessor()
+        st.sidebar.success("Препроцессор (mlp_preprocessor.pkl) успешно загружен.")
+    except FileNotFoundError as e:
+        st.sidebar.error(str(e))
+    except Exception as e:
+        st.sidebar.error(f"Ошибка загрузки препроцессора: {str(e)}")
     return loaded_preprocessor
 
 @st.cache_resource
+def get_model_pool():
+    # One pool per server process: shared by all sessions, warmed up in a background thread
+    pool = ModelPool()
+    pool.start_preload()
+    return pool
+
 def load_selected_model(model_filename):
-    model_path = os.path.join('models', model_filename)
     loaded_model = None
-    if os.path.exists(model_path):
-        try:
-            if model_filename.endswith('.h5'):
-                loaded_model = tf.keras.models.load_model(model_path)
-                st.sidebar.info(f"Модель Keras ({model_filename}) успешно загружена.")
-            elif model_filename.endswith('.pkl'):
-                loaded_model = joblib.load(model_path)
-                st.sidebar.info(f"Модель ({model_filename}) успешно загружена.")
-            else:
-                st.sidebar.error(f"Неизвестный формат файла модели: {model_filename}")
-        except Exception as e:
-            st.sidebar.error(f"Ошибка загрузки модели {model_filename}: {str(e)}")
-    else:
-        st.sidebar.error(f"Файл модели не найден: {model_path}")
+    try:
+        with tracing.span("load", model_filename):
+            loaded_model = get_model_pool().get(model_filename)
+    except (FileNotFoundError, ValueError) as e:
+        st.sidebar.error(str(e))
+    except Exception as e:
+        st.sidebar.error(f"Ошибка загрузки модели {model_filename}: {str(e)}")
     return loaded_model
 
+# A single cached engine: engines hold a model reference, so keeping one per model
+# would pin models that the pool has already evicted
+@st.cache_resource(max_entries=1)
+def get_scoring_engine(model_filename, model_id, _model, _preprocessor):
+    return ScoringEngine(model_filename, model=_model, preprocessor=_preprocessor)
+
+# Calibration runs one prediction pass over a dataset sample, so it is done once per loaded model
+@st.cache_resource(max_entries=1)
+def get_explainer(model_filename, model_id, _model, _preprocessor):
+    return Explainer.build(_model, model_filename, _preprocessor)
+
+@st.cache_resource
+def get_compiled_preprocessor(dtype_name, signature, _preprocessor):
+    return compile_preprocessor(_preprocessor, dtype=dtype_name)
+
+@st.cache_resource
+def get_prediction_cache():
+    return PredictionCache()
+
+def show_comparison_summary(comparison, display_names):
+    summary = comparison.summary(display_names).rename(columns={
+        "model": "Модель",
+        "weight": "Вес",
+        "predicted_price": "Цена, $",
+        "latency_ms": "Время предсказания, мс",
+    })
+    st.dataframe(summary.style.format({"Вес": "{:.2f}", "Цена, $": "{:,.2f}", "Время предсказания, мс": "{:.1f}"}),
+                 hide_index=True)
+    st.caption(f"Препроцессор выполнен один раз за {comparison.preprocess_seconds * 1000:.1f} мс")
+
+def show_training_info(manifest, model_filename):
+    info = manifest["models"].get(model_filename) if manifest else None
+    if info is None:
+        return
+    metrics = info["metrics"]
+    st.sidebar.caption(
+        f"Версия {info.get('version', manifest['version'])}: RMSE на тесте {metrics['test_rmse']:,.0f}, "
+        f"R² {metrics['test_r2']:.3f}, обучение {info['training_seconds']:.0f} с"
+    )
+
+def show_pool_stats(pool):
+    stats = pool.stats()
+    with st.sidebar.expander("Пул моделей"):
+        st.caption(f"Занято {stats['resident_bytes'] / 1024 / 1024:.1f} из {stats['budget_bytes'] / 1024 / 1024:.0f} МБ, "
+                   f"загрузок {stats['loads']}, вытеснений {stats['evictions']}")
+        if stats['preload_pending']:
+            st.caption(f"Прогрев в фоне: {', '.join(stats['preload_pending'])}")
+        if stats['models']:
+            st.dataframe(pd.DataFrame([
+                {
+                    "Модель": name,
+                    "Размер, КБ": info['size_bytes'] / 1024,
+                    "Загрузка, с": info['load_seconds'],
+                    "Использований": info['uses'],
+                }
+                for name, info in stats['models'].items()
+            ]).style.format({"Размер, КБ": "{:,.0f}", "Загрузка, с": "{:.2f}"}), hide_index=True)
+
+def show_prediction_details(details, explainer):
+    calibration = explainer.calibration
+    st.write(f"Интервал {calibration['coverage']:.0%}: ${details[LOW_COLUMN]:,.0f} – ${details[HIGH_COLUMN]:,.0f}")
+    if calibration.get('source') == 'validation':
+        st.caption("Интервал откалиброван на валидационной выборке при обучении (train.py)")
+    else:
+        st.caption("Интервал откалиброван на выборке из post_diamonds.csv, на которой модель могла обучаться, "
+                   "поэтому он может быть уже реального")
+    if not explainer.supports_contributions:
+        st.caption("Вклад признаков для этой модели не вычисляется")
+        return
+    contributions = pd.Series({feature: details[contribution_column(feature)] for feature in FEATURE_COLUMNS},
+                              name="Вклад, $")
+    st.bar_chart(contributions, horizontal=True)
+    st.caption(f"Средняя цена {details[BASE_COLUMN]:,.0f} $ плюс вклады признаков дают предсказание")
+
+def show_batch_result(result_df, label, file_stem, key):
+    # Only a preview is rendered; the files are written chunk by chunk when a download is requested
+    st.dataframe(result_df.head(PREVIEW_ROWS))
+    if len(result_df) > PREVIEW_ROWS:
+        st.caption(f"Показаны первые {PREVIEW_ROWS:,} из {len(result_df):,} строк, полный результат доступен в файле")
+    file_formats = ["csv"] + (["parquet"] if parquet_available() else [])
+    for column, file_format in zip(st.columns(len(file_formats)), file_formats):
+        with column:
+            st.download_button(
+                f"{label} (.{file_format})",
+                data=lambda file_format=file_format: export_bytes(result_df, file_format),
+                file_name=f"{file_stem}.{file_format}",
+                mime=EXPORT_FORMATS[file_format],
+                on_click="ignore",
+                key=f"{key}_{file_format}"
+            )
+
+def show_validation_errors(validation, limit=1000):
+    with st.expander("Некорректные строки"):
+        st.dataframe(validation.column_summary().rename(columns={
+            "column": "Колонка", "reason": "Проблема", "rows": "Строк"
+        }), hide_index=True)
+        report = validation.report(limit).rename(columns={"row": "Строка", "errors": "Ошибки"})
+        st.dataframe(report, hide_index=True)
+        if validation.n_invalid > limit:
+            st.caption(f"Показаны первые {limit} из {validation.n_invalid} строк")
+
+def show_stage_metrics():
+    snapshot = tracing.tracer.snapshot()
+    with st.sidebar.expander("Метрики этапов"):
+        if not tracing.tracer.enabled:
+            st.caption(f"Трассировка отключена ({tracing.TRACING_ENV}=0)")
+            return
+        if not snapshot['stages']:
+            st.caption("Запросов пока не было")
+            return
+        st.dataframe(pd.DataFrame([
+            {
+                "Этап": item['stage'],
+                "Модель": item['model'],
+                "Действие": item['request'],
+                "Вызовов": item['count'],
+                "p50, мс": item['p50_seconds'] * 1000,
+                "p95, мс": item['p95_seconds'] * 1000,
+                "Среднее, мс": item['sum_seconds'] / item['count'] * 1000,
+                "Строк": item['rows'],
+            }
+            for item in snapshot['stages']
+        ]).style.format({"p50, мс": "{:.1f}", "p95, мс": "{:.1f}", "Среднее, мс": "{:.1f}"}), hide_index=True)
+
+def show_profile(request):
+    if request.profile_summary is None:
+        return
+    with st.expander("Профиль запроса (cProfile)"):
+        if request.profile_path:
+            st.caption(f"Сохранён в {request.profile_path}, откройте через snakeviz или pstats")
+        st.code(request.profile_summary)
+
 def show_page():
     st.title("💎 Предсказание цены бриллианта")
 
-    preprocessor = load_preprocessor()
+    preprocessor_signature = model_registry.artifact_signature(model_registry.PREPROCESSOR_FILE)
+    preprocessor = load_preprocessor(preprocessor_signature)
     if preprocessor is None:
         st.error("Не удалось загрузить препроцессор. Проверьте сообщения в боковой панели.")
         return
     st.session_state.preprocessor = preprocessor
 
-    selected_model_name = st.selectbox(
-    "Выберите модель для предсказания:",
-    options=list(MODEL_FILES.keys()),
-    key="model_selector"
+    compare_mode = st.checkbox(
+        "Сравнить все модели",
+        key="compare_mode",
+        help="Препроцессор запускается один раз, все модели считают предсказания параллельно, "
+             "дополнительно выводится взвешенный ансамбль."
+    )
+    prediction_cache = get_prediction_cache()
+    profile_next = st.sidebar.checkbox(
+        "Профилировать следующий запрос",
+        key="profile_next_request",
+        help="Запустить следующее предсказание под cProfile и показать самые затратные вызовы."
     )
 
-    selected_model_filename = MODEL_FILES[selected_model_name]
+    if compare_mode:
+        display_names = {filename: name for name, filename in MODEL_FILES.items()}
+        comparison_models = {}
+        with st.spinner("Загрузка всех моделей..."):
+            for model_filename in MODEL_FILES.values():
+                loaded_model = load_selected_model(model_filename)
+                if loaded_model is not None:
+                    comparison_models[model_filename] = loaded_model
+        if not comparison_models:
+            st.error("Не удалось загрузить ни одной модели. Проверьте сообщения в боковой панели.")
+            return
+        with st.expander("Веса ансамбля"):
+            ensemble_weights = {
+                model_filename: st.number_input(
+                    display_names[model_filename], min_value=0.0, value=1.0, step=0.1,
+                    key=f"ensemble_weight_{model_filename}"
+                )
+                for model_filename in comparison_models
+            }
+        # float64 features suit every backend, so one matrix is shared by all models
+        comparison_preprocessor = get_compiled_preprocessor("float64", preprocessor_signature, preprocessor)
+        st.sidebar.success(f"Режим сравнения: {len(comparison_models)} моделей")
+    else:
+        selected_model_name = st.selectbox(
+        "Выберите модель для предсказания:",
+        options=list(MODEL_FILES.keys()),
+        key="model_selector"
+        )
 
-    model_session_key = f"model_{selected_model_filename}"
+        selected_model_filename = MODEL_FILES[selected_model_name]
 
-    if model_session_key not in st.session_state or st.session_state[model_session_key] is None:
         with st.spinner(f'Загрузка модели "{selected_model_name}"...'):
-            st.session_state[model_session_key] = load_selected_model(selected_model_filename)
-    
-    model = st.session_state[model_session_key]
+            model = load_selected_model(selected_model_filename)
 
-    if model is None:
-        st.error(f"Не удалось загрузить модель '{selected_model_name}'. Проверьте сообщения в боковой панели.")
-        return
-    st.sidebar.success(f"Активная модель: {selected_model_name}")
+        if model is None:
+            st.error(f"Не удалось загрузить модель '{selected_model_name}'. Проверьте сообщения в боковой панели.")
+            return
+        st.sidebar.success(f"Активная модель: {selected_model_name}")
+        show_training_info(model_registry.load_manifest(), selected_model_filename)
 
-    expected_columns_order = ['carat', 'cut', 'color', 'clarity', 'depth', 'table', 'x', 'y', 'z']
+        dtype_name = backend_dtype(model_registry.get_backend(selected_model_filename)).__name__
+        fast_preprocessor = get_compiled_preprocessor(dtype_name, preprocessor_signature, preprocessor)
+        show_details = st.checkbox(
+            "Показать интервал и вклад признаков",
+            key="explain_predictions",
+            help="Доверительный интервал цены и вклад каждого признака (TreeSHAP для бустингов, точное разложение "
+                 "для полиномиальной регрессии). Для больших файлов заметно дольше обычного предсказания."
+        )
 
     with st.form("prediction_form"):
         st.subheader("Параметры бриллианта")
@@ -91,11 +262,11 @@ def show_page():
         
         with col1:
             carat = st.number_input("Вес (карат)", min_value=0.1, max_value=10.0, value=0.7, step=0.1, key="carat_input")
-            cut = st.selectbox("Качество огранки", ["Ideal", "Premium", "Very Good", "Good", "Fair"], index=0, key="cut_input")
-            color = st.selectbox("Цвет (от D до J)", ["D", "E", "F", "G", "H", "I", "J"], index=3, key="color_input")
+            cut = st.selectbox("Качество огранки", list(CATEGORY_CODES['cut']), index=0, key="cut_input")
+            color = st.selectbox("Цвет (от D до J)", list(CATEGORY_CODES['color']), index=3, key="color_input")
             
         with col2:
-            clarity = st.selectbox("Чистота", ["IF", "VVS1", "VVS2", "VS1", "VS2", "SI1", "SI2", "I1"], index=3, key="clarity_input")
+            clarity = st.selectbox("Чистота", list(CATEGORY_CODES['clarity']), index=3, key="clarity_input")
             depth = st.number_input("Глубина (%)", min_value=43.0, max_value=79.0, value=61.5, step=0.1, key="depth_input")
             table = st.number_input("Поверхность стола (%)", min_value=43.0, max_value=95.0, value=57.0, step=0.1, key="table_input")
         
@@ -109,29 +280,40 @@ def show_page():
             try:
                 input_data_dict = {
                     'carat': carat,
-                    'cut': cut,
-                    'color': color,
-                    'clarity': clarity,
+                    'cut': CATEGORY_CODES['cut'][cut],
+                    'color': CATEGORY_CODES['color'][color],
+                    'clarity': CATEGORY_CODES['clarity'][clarity],
                     'depth': depth,
                     'table': table,
                     'x': x,
                     'y': y,
                     'z': z
                 }
-                input_df = pd.DataFrame([input_data_dict])
-                
-                processed_input = preprocessor.transform(input_df)
-                
-                prediction_array = model.predict(processed_input)
-                if prediction_array.ndim == 2 and prediction_array.shape[0] == 1 and prediction_array.shape[1] == 1:
-                    prediction_scalar = float(prediction_array[0, 0])
-                elif prediction_array.ndim == 1 and prediction_array.shape[0] == 1:
-                    prediction_scalar = float(prediction_array[0])
+                if compare_mode:
+                    with tracing.request("compare_predict", profile=profile_next) as request:
+                        comparison = compare_models(comparison_models, input_data_dict,
+                                                    comparison_preprocessor, ensemble_weights)
+                    st.success(f"### Ансамбль моделей: ${comparison.ensemble[0]:,.2f}")
+                    show_comparison_summary(comparison, display_names)
                 else:
-                    st.warning(f"Неожиданная форма массива предсказаний: {prediction_array.shape}. Используется первый элемент.")
-                    prediction_scalar = float(prediction_array.flatten()[0]) 
+                    def score_row(row):
+                        with tracing.span("transform", selected_model_filename, 1):
+                            processed = fast_preprocessor.transform(row)
+                        with tracing.span("predict", selected_model_filename, 1):
+                            return model_registry.predict(model, processed)
 
-                st.success(f"### Предсказанная цена: ${prediction_scalar:,.2f}")
+                    with tracing.request("form_predict", profile=profile_next) as request:
+                        prediction_scalar = prediction_cache.predict_row(
+                            selected_model_filename, input_data_dict, score_row
+                        )
+
+                    st.success(f"### Предсказанная цена: ${prediction_scalar:,.2f}")
+                    if show_details:
+                        explainer = get_explainer(selected_model_filename, id(model), model, fast_preprocessor)
+                        with tracing.span("explain", selected_model_filename, 1):
+                            details = explainer.explain(input_data_dict, predictions=np.array([prediction_scalar]))
+                        show_prediction_details(details.iloc[0], explainer)
+                show_profile(request)
                 
             except Exception as e:
                 st.error(f"Произошла ошибка при предсказании: {str(e)}")
@@ -144,34 +326,70 @@ def show_page():
     
     if uploaded_file is not None:
         try:
-            df_upload = pd.read_csv(uploaded_file)
+            with tracing.span("parse") as parse_span:
+                df_upload = pd.read_csv(uploaded_file)
+                parse_span.rows = len(df_upload)
             st.write("Предпросмотр загруженных данных:")
             st.dataframe(df_upload.head())
             
-            missing_cols = [col for col in expected_columns_order if col not in df_upload.columns]
+            with tracing.span("validate", rows=len(df_upload)):
+                missing_cols = schema.missing_columns(df_upload)
+                validation = None if missing_cols else schema.validate(df_upload)
             if missing_cols:
                 st.warning(f"В загруженном файле отсутствуют необходимые колонки: {', '.join(missing_cols)}. Пожалуйста, исправьте файл.")
+            elif validation.n_invalid == len(df_upload):
+                st.error("Ни одна строка файла не прошла проверку значений.")
+                show_validation_errors(validation)
             else:
-                if st.button("Сделать пакетное предсказание", key="batch_predict_button"):
-                    with st.spinner("Выполняется пакетное предсказание..."):
-                        processed_df = preprocessor.transform(df_upload[expected_columns_order])
-                        
-                        predictions = model.predict(processed_df)
-                        
-                        result_df = df_upload.copy()
-                        result_df['predicted_price'] = predictions.flatten()
-                        
-                        st.success("Предсказания успешно выполнены!")
-                        st.dataframe(result_df)
-                        
-                        csv_output = result_df.to_csv(index=False).encode('utf-8')
-                        st.download_button(
-                            "Скачать результаты (.csv)",
-                            data=csv_output,
-                            file_name="diamond_batch_predictions.csv",
-                            mime="text/csv",
-                            key="download_csv_button"
+                if validation.n_invalid:
+                    st.warning(f"{validation.n_invalid} из {len(df_upload)} строк содержат некорректные значения: "
+                               f"они будут пропущены, цена для них останется пустой.")
+                    show_validation_errors(validation)
+                if compare_mode and st.button("Сравнить модели на файле", key="batch_compare_button"):
+                    with st.spinner("Выполняется пакетное предсказание всеми моделями..."), \
+                            tracing.request("batch_compare", profile=profile_next) as request:
+                        features = validation.valid_frame()
+                        comparison = compare_models(comparison_models, features,
+                                                    comparison_preprocessor, ensemble_weights)
+                        # Skipped rows get NaN when aligned on the index; columns are added to the upload in place
+                        comparison_df = comparison.to_frame().set_index(features.index).reindex(df_upload.index)
+                        for column in comparison_df.columns:
+                            df_upload[column] = comparison_df[column].to_numpy()
+
+                        st.success("Предсказания всех моделей успешно выполнены!")
+                        show_comparison_summary(comparison, display_names)
+                        show_batch_result(df_upload, "Скачать сравнение", "diamond_batch_comparison",
+                                          "download_comparison")
+                    show_profile(request)
+                elif not compare_mode and st.button("Сделать пакетное предсказание", key="batch_predict_button"):
+                    with st.spinner("Выполняется пакетное предсказание..."), \
+                            tracing.request("batch_predict", profile=profile_next) as request:
+                        engine = get_scoring_engine(selected_model_filename, id(model), model, fast_preprocessor)
+                        df_upload[PREDICTION_COLUMN] = score_valid_rows(
+                            validation,
+                            lambda chunk: prediction_cache.predict(selected_model_filename, chunk, engine.predict)
                         )
+                        if show_details:
+                            explainer = get_explainer(selected_model_filename, id(model), model, fast_preprocessor)
+                            with tracing.span("explain", selected_model_filename, len(df_upload)):
+                                details = frame_for_valid_rows(validation, explainer.explain,
+                                                               df_upload[PREDICTION_COLUMN].to_numpy())
+                            for column in details.columns:
+                                df_upload[column] = details[column].to_numpy()
+
+                        st.success("Предсказания успешно выполнены!")
+                        show_batch_result(df_upload, "Скачать результаты", "diamond_batch_predictions",
+                                          "download_predictions")
+                    show_profile(request)
                         
         except Exception as e:
             st.error(f"Ошибка при обработке CSV файла: {str(e)}")
+
+    show_pool_stats(get_model_pool())
+    show_stage_metrics()
+
+    cache_stats = prediction_cache.stats()
+    st.sidebar.caption(
+        f"Кэш предсказаний: {cache_stats['entries']} записей, "
+        f"{cache_stats['bytes'] / 1024:.0f} КБ, попаданий {cache_stats['hit_rate']:.0%}"
+    )
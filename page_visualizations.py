@@ -1,26 +1,157 @@
 import streamlit as st
-from PIL import Image
+import altair as alt
+import numpy as np
+import pandas as pd
+import json
 import os
-from page_prediction import MODEL_FILES
 
-def show_page():
-    st.title("📊 Визуальный анализ датасета бриллиантов")
-    st.markdown("""
-    На этой странице представлены визуализации, демонстрирующие взаимосвязи между характеристиками бриллиантов и их ценой.
-    """)
+from aggregates import CORRELATION_COLUMNS, load_aggregates
+from dataset import CATEGORICAL_COLUMNS, category_label
+from model_registry import MODEL_FILES
+
+FIGURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'figures')
+# Written by benchmarks/bench_inference.py; fresh results take precedence over the stored baseline
+BENCHMARK_FILES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'inference_results.json'),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'inference_baseline.json'),
+]
+
+@st.cache_data
+def list_metric_figures(figures_mtime):
+    return sorted(f for f in os.listdir(FIGURES_DIR) if f.lower().endswith("metrics.png"))
+
+@st.cache_data
+def load_benchmark_report(path, mtime):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def benchmark_table(report):
+    display_names = {filename: name for name, filename in MODEL_FILES.items()}
+    rows = []
+    for model_filename, result in report["models"].items():
+        row = {
+            "Модель": display_names.get(model_filename, model_filename),
+            "Загрузка, с": result["import_seconds"] + result["load_seconds"],
+            "Пиковая RSS, МБ": result["peak_rss_mb"],
+            "1 строка p50, мс": result["single_row"]["p50_ms"],
+            "1 строка p95, мс": result["single_row"]["p95_ms"],
+        }
+        for batch_size, batch in result["batches"].items():
+            row[f"Строк/с (батч {int(batch_size):,})"] = batch["rows_per_second"]
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def show_inference_benchmarks():
+    path = next((path for path in BENCHMARK_FILES if os.path.exists(path)), None)
+    if path is None:
+        st.info("Результатов бенчмарка нет. Запустите `python benchmarks/bench_inference.py`.")
+        return
+    try:
+        report = load_benchmark_report(path, os.stat(path).st_mtime_ns)
+        table = benchmark_table(report)
+    except (OSError, ValueError, KeyError) as e:
+        st.warning(f"Не удалось прочитать результаты бенчмарка {os.path.basename(path)}: {e}")
+        return
+    number_formats = {column: "{:,.0f}" for column in table.columns if column.startswith("Строк/с")}
+    number_formats.update({"Загрузка, с": "{:.2f}", "Пиковая RSS, МБ": "{:,.0f}",
+                           "1 строка p50, мс": "{:.2f}", "1 строка p95, мс": "{:.2f}"})
+    st.dataframe(table.style.format(number_formats, na_rep="—"), hide_index=True, use_container_width=True)
+    machine = report.get("machine", {})
+    st.caption(f"{os.path.basename(path)}, {report.get('created_at', '')}: {machine.get('platform', '')}, "
+               f"ядер: {machine.get('cpu_count', '?')}")
+
+def display_image_with_caption(image_path, caption):
+    try:
+        st.image(os.path.join(FIGURES_DIR, image_path), caption=caption, use_container_width=True)
+    except Exception as e:
+        st.warning(f"Не удалось загрузить изображение {image_path}")
+
+# All charts below are drawn from binned aggregates, so their size does not depend on the
+# number of rows in the dataset
+
+def price_distribution_chart(edges, counts):
+    df = pd.DataFrame({"start": edges[:-1], "end": edges[1:], "count": counts})
+    return alt.Chart(df).mark_bar().encode(
+        x=alt.X("start:Q", title="Цена, $"),
+        x2="end:Q",
+        y=alt.Y("count:Q", title="Количество"),
+        tooltip=[alt.Tooltip("start:Q", title="От, $", format=",.0f"),
+                 alt.Tooltip("end:Q", title="До, $", format=",.0f"),
+                 alt.Tooltip("count:Q", title="Количество")]
+    ).interactive()
 
-    def display_image_with_caption(image_path, caption):
-        try:
-            image = Image.open(f"figures/{image_path}")
-            st.image(image, caption=caption, use_container_width=True)
-        except Exception as e:
-            st.warning(f"Не удалось загрузить изображение {image_path}")
+def price_vs_carat_chart(carat_edges, price_edges, counts):
+    carat_index, price_index = np.nonzero(counts)
+    df = pd.DataFrame({
+        "carat": carat_edges[carat_index], "carat_end": carat_edges[carat_index + 1],
+        "price": price_edges[price_index], "price_end": price_edges[price_index + 1],
+        "count": counts[carat_index, price_index],
+    })
+    return alt.Chart(df).mark_rect().encode(
+        x=alt.X("carat:Q", title="Вес, карат"),
+        x2="carat_end:Q",
+        y=alt.Y("price:Q", title="Цена, $"),
+        y2="price_end:Q",
+        color=alt.Color("count:Q", title="Количество", scale=alt.Scale(type="log", scheme="viridis")),
+        tooltip=[alt.Tooltip("carat:Q", title="Вес от", format=".2f"),
+                 alt.Tooltip("price:Q", title="Цена от, $", format=",.0f"),
+                 alt.Tooltip("count:Q", title="Количество")]
+    ).interactive()
 
+def price_box_chart(quantiles, column):
+    df = pd.DataFrame([
+        {"label": category_label(column, code), "q05": q[0], "q25": q[1], "median": q[2], "q75": q[3], "q95": q[4]}
+        for code, q in quantiles.items()
+    ])
+    base = alt.Chart(df).encode(
+        x=alt.X("label:N", title=None, sort=list(df["label"])),
+        tooltip=[alt.Tooltip(name, format=",.0f") for name in ("q05", "q25", "median", "q75", "q95")]
+    )
+    whiskers = base.mark_rule().encode(y=alt.Y("q05:Q", title="Цена, $"), y2="q95:Q")
+    boxes = base.mark_bar(size=28).encode(y="q25:Q", y2="q75:Q")
+    medians = base.mark_tick(color="white", size=28, thickness=2).encode(y="median:Q")
+    return whiskers + boxes + medians
+
+def category_counts_chart(counts, rows, columns):
+    row_codes, column_codes = np.indices(counts.shape)
+    df = pd.DataFrame({
+        rows: [category_label(rows, code) for code in row_codes.ravel()],
+        columns: [category_label(columns, code) for code in column_codes.ravel()],
+        "count": counts.ravel(),
+    })
+    base = alt.Chart(df).encode(
+        x=alt.X(f"{columns}:N", sort=list(dict.fromkeys(df[columns]))),
+        y=alt.Y(f"{rows}:N", sort=list(dict.fromkeys(df[rows])))
+    )
+    heatmap = base.mark_rect().encode(color=alt.Color("count:Q", title="Количество"),
+                                      tooltip=[rows, columns, "count:Q"])
+    labels = base.mark_text(fontSize=10).encode(text="count:Q")
+    return heatmap + labels
+
+def correlation_chart(corr):
+    n = len(CORRELATION_COLUMNS)
+    df = pd.DataFrame({
+        "row": np.repeat(CORRELATION_COLUMNS, n),
+        "column": np.tile(CORRELATION_COLUMNS, n),
+        "value": corr.ravel(),
+    })
+    base = alt.Chart(df).encode(
+        x=alt.X("column:N", sort=CORRELATION_COLUMNS, title=None),
+        y=alt.Y("row:N", sort=CORRELATION_COLUMNS, title=None)
+    )
+    heatmap = base.mark_rect().encode(
+        color=alt.Color("value:Q", title="Корреляция", scale=alt.Scale(domain=[-1, 1], scheme="redblue", reverse=True)),
+        tooltip=["row", "column", alt.Tooltip("value:Q", format=".2f")]
+    )
+    labels = base.mark_text(fontSize=9).encode(text=alt.Text("value:Q", format=".2f"))
+    return heatmap + labels
+
+def show_filtered_charts(aggregates, mask):
     col1, col2 = st.columns(2)
 
     with st.expander("📈 Основные распределения", expanded=True):
         st.subheader("Распределение цен на бриллианты")
-        display_image_with_caption("price_distribution.png", "Распределение цен на бриллианты")
+        st.altair_chart(price_distribution_chart(*aggregates.price_histogram(mask)), use_container_width=True)
         st.markdown("""
         - Большинство бриллиантов в датасете имеют цену до $5000
         - Распределение имеет длинный хвост вправо, что типично для ценовых данных
@@ -31,7 +162,7 @@ def show_page():
         st.subheader("Зависимость цены от характеристик")
         
         st.markdown("### Влияние веса на цену")
-        display_image_with_caption("price_vs_carat.png", "Зависимость цены от веса (карат)")
+        st.altair_chart(price_vs_carat_chart(*aggregates.price_vs_carat(mask)), use_container_width=True)
         st.markdown("""
         - Четко видна нелинейная зависимость цены от веса
         - Наблюдаются горизонтальные линии, что может указывать на округление цен
@@ -39,7 +170,7 @@ def show_page():
         """)
         
         st.markdown("### Влияние качества огранки")
-        display_image_with_caption("cut_vs_price.png", "Влияние качества огранки на цену")
+        st.altair_chart(price_box_chart(aggregates.price_quantiles(mask, 'cut'), 'cut'), use_container_width=True)
         st.markdown("""
         - Бриллианты с идеальной огранкой (Ideal) в среднем дешевле, чем с премиальной
         - Это объясняется тем, что при лучшей огранке теряется больше веса камня
@@ -50,7 +181,8 @@ def show_page():
         st.subheader("Анализ категориальных признаков")
         
         st.markdown("### Распределение по цвету и чистоте")
-        display_image_with_caption("color_clarity_distribution.png", "Распределение бриллиантов по цвету и чистоте")
+        st.altair_chart(category_counts_chart(aggregates.category_counts(mask, 'color', 'clarity'), 'color', 'clarity'),
+                        use_container_width=True)
         st.markdown("""
         - Наиболее распространены бриллианты с цветами G, H, I
         - Наибольшее количество бриллиантов имеют чистоту SI1, VS2, VS1
@@ -58,14 +190,46 @@ def show_page():
         """)
         
         st.markdown("### Корреляция признаков")
-        display_image_with_caption("correlation_matrix.png", "Корреляционная матрица числовых признаков")
+        st.altair_chart(correlation_chart(aggregates.correlation(mask)), use_container_width=True)
         st.markdown("""
         - Наибольшая корреляция с ценой у веса (carat) и размеров (x, y, z)
         - Сильная корреляция между размерами и весом (мультиколлинеарность)
         - Глубина (depth) имеет слабую корреляцию с ценой
         """)
 
-    metrics_files = [f for f in os.listdir("figures") if f.lower().endswith("metrics.png")]
+def show_page():
+    st.title("📊 Визуальный анализ датасета бриллиантов")
+    st.markdown("""
+    На этой странице представлены визуализации, демонстрирующие взаимосвязи между характеристиками бриллиантов и их ценой.
+    """)
+
+    try:
+        aggregates = load_aggregates()
+    except Exception as e:
+        st.error(f"Ошибка при подготовке агрегатов датасета: {e}")
+        return
+
+    st.subheader("Фильтры")
+    filter_columns = st.columns(3)
+    filters = {}
+    for column, title, container in zip(CATEGORICAL_COLUMNS, ("Огранка", "Цвет", "Чистота"), filter_columns):
+        codes = aggregates.codes(column)
+        with container:
+            selected = st.multiselect(title, codes, default=codes, key=f"viz_filter_{column}",
+                                      format_func=lambda code, column=column: category_label(column, code))
+        # Everything selected is the same as no filter
+        filters[column] = None if len(selected) == len(codes) else selected
+
+    mask = aggregates.cell_mask(**filters)
+    selected_rows = aggregates.count(mask)
+    st.caption(f"Бриллиантов в выборке: {selected_rows:,}")
+    # Model metrics and benchmarks below do not depend on the filters, so they are shown either way
+    if selected_rows == 0:
+        st.warning("Под выбранные фильтры не попадает ни один бриллиант.")
+    else:
+        show_filtered_charts(aggregates, mask)
+
+    metrics_files = list_metric_figures(os.stat(FIGURES_DIR).st_mtime_ns) if os.path.isdir(FIGURES_DIR) else []
     if metrics_files:
         st.markdown("---")
         st.header("Оценка моделей машинного обучения")
@@ -104,3 +268,7 @@ def show_page():
                 fallback_name = metric_file.lower().removesuffix("metrics.png").replace("_", " ").title()
                 st.subheader(f"Модель: {fallback_name}")
                 display_image_with_caption(metric_file, f"Метрики файла {metric_file}")
+
+    st.markdown("---")
+    st.header("Скорость инференса моделей")
+    show_inference_benchmarks()
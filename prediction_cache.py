@@ -0,0 +1,152 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from dataset import file_signature
+from model_registry import FEATURE_COLUMNS, file_digest, model_path
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# Inputs that differ only past this many decimals share a cache entry
+FLOAT_DECIMALS = 6
+
+# Approximate per-entry cost of the OrderedDict slot and linked-list node
+_ENTRY_OVERHEAD = 120
+
+
+def canonicalize_value(value):
+    if isinstance(value, (str, bool, np.bool_)):
+        return value
+    return np.round(float(value), FLOAT_DECIMALS).item() + 0.0
+
+
+def canonicalize(frame):
+    canon = {}
+    for col in FEATURE_COLUMNS:
+        values = frame[col]
+        if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+            values = np.round(values.to_numpy(dtype=np.float64), FLOAT_DECIMALS)
+            # -0.0 and 0.0 must hash to the same key
+            values = values + 0.0
+        canon[col] = values
+    return pd.DataFrame(canon)
+
+
+class PredictionCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._model_keys = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def model_key(self, model_filename):
+        path = model_path(model_filename)
+        signature = file_signature(path)
+        with self._lock:
+            known = self._model_keys.get(model_filename)
+            if known is not None and known[0] == signature:
+                return known[1]
+        key = (model_filename, file_digest(path))
+        with self._lock:
+            previous = self._model_keys.get(model_filename)
+            self._model_keys[model_filename] = (signature, key)
+            if previous is not None and previous[1] != key:
+                self._drop_model(previous[1])
+        return key
+
+    def _drop_model(self, stale_key):
+        for key in [key for key in self._entries if key[0] == stale_key]:
+            self._bytes -= self._entry_size(key)
+            del self._entries[key]
+
+    def invalidate(self, model_filename=None):
+        with self._lock:
+            if model_filename is None:
+                self._entries.clear()
+                self._bytes = 0
+                self._model_keys.clear()
+                return
+            known = self._model_keys.pop(model_filename, None)
+            if known is not None:
+                self._drop_model(known[1])
+
+    @staticmethod
+    def _entry_size(key):
+        return (_ENTRY_OVERHEAD + sys.getsizeof(key) + sys.getsizeof(key[1])
+                + sum(sys.getsizeof(value) for value in key[1]) + sys.getsizeof(0.0))
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                    found[i] = value
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def _store(self, keys, values):
+        with self._lock:
+            for key, value in zip(keys, values):
+                if key in self._entries:
+                    continue
+                self._entries[key] = float(value)
+                self._bytes += self._entry_size(key)
+            while self._bytes > self.max_bytes and self._entries:
+                key, _ = self._entries.popitem(last=False)
+                self._bytes -= self._entry_size(key)
+                self.evictions += 1
+
+    def predict(self, model_filename, frame, score):
+        # Duplicate rows inside the batch are scored once, already cached rows are not scored,
+        # and the results are scattered back to the original row order
+        model_key = self.model_key(model_filename)
+        canon = canonicalize(frame)
+        row_hashes = pd.util.hash_pandas_object(canon, index=False).to_numpy()
+        _, first_rows, codes = np.unique(row_hashes, return_index=True, return_inverse=True)
+        unique_rows = canon.iloc[first_rows]
+        features = zip(*(unique_rows[col].tolist() for col in FEATURE_COLUMNS))
+        keys = [(model_key, row) for row in features]
+
+        unique_values = np.empty(len(keys), dtype=np.float64)
+        found = self._lookup(keys)
+        for i, value in found.items():
+            unique_values[i] = value
+
+        missing = np.array([i for i in range(len(keys)) if i not in found], dtype=np.intp)
+        if len(missing):
+            predictions = np.asarray(score(frame.iloc[first_rows[missing]])).reshape(-1)
+            unique_values[missing] = predictions
+            self._store([keys[i] for i in missing], predictions)
+        return unique_values[codes]
+
+    def predict_row(self, model_filename, row, score):
+        # Single-row variant for the form: the key is built straight from the mapping
+        key = (self.model_key(model_filename), tuple(canonicalize_value(row[col]) for col in FEATURE_COLUMNS))
+        found = self._lookup([key])
+        if found:
+            return found[0]
+        prediction = float(np.asarray(score(row)).reshape(-1)[0])
+        self._store([key], [prediction])
+        return prediction
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
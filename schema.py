@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+from dataset import CATEGORICAL_COLUMNS, CATEGORY_LABELS, NUMERIC_COLUMNS
+from model_registry import FEATURE_COLUMNS
+
+# Same limits as the input form; None leaves that side open
+NUMERIC_RANGES = {
+    'carat': (0.1, 10.0),
+    'depth': (43.0, 79.0),
+    'table': (43.0, 95.0),
+    'x': (0.0, None),
+    'y': (0.0, None),
+    'z': (0.0, None),
+}
+
+CATEGORY_CODES = {col: {label: code for code, label in labels.items()} for col, labels in CATEGORY_LABELS.items()}
+# Upper-cased labels for case-insensitive lookup of text values
+_LABEL_LOOKUP = {col: {label.upper(): code for label, code in codes.items()} for col, codes in CATEGORY_CODES.items()}
+
+OK, MISSING, INVALID, OUT_OF_RANGE = 0, 1, 2, 3
+REASONS = {MISSING: "пусто", INVALID: "некорректное значение", OUT_OF_RANGE: "вне допустимого диапазона"}
+INVALID_CODE = -1
+
+
+class ValidationResult:
+    def __init__(self, frame, reasons):
+        # frame holds coerced features for every row: int8 category codes (-1 where invalid) and float64 numbers
+        self.frame = frame
+        self.reasons = reasons
+        self.invalid = np.logical_or.reduce([reason != OK for reason in reasons.values()])
+
+    @property
+    def valid(self):
+        return ~self.invalid
+
+    @property
+    def n_invalid(self):
+        return int(self.invalid.sum())
+
+    def valid_frame(self):
+        if not self.invalid.any():
+            return self.frame
+        return self.frame[self.valid]
+
+    def column_summary(self):
+        return pd.DataFrame([
+            {"column": col, "reason": REASONS[code], "rows": int(count)}
+            for col, reason in self.reasons.items()
+            for code, count in zip(*np.unique(reason[reason != OK], return_counts=True))
+        ], columns=["column", "reason", "rows"])
+
+    def report(self, limit=1000):
+        # Messages are built for the first `limit` invalid rows only, one vectorized pass per column
+        positions = np.flatnonzero(self.invalid)[:limit]
+        messages = np.full(len(positions), "", dtype=object)
+        for col, reason in self.reasons.items():
+            codes = reason[positions]
+            for code, text in REASONS.items():
+                messages = np.where(codes == code, messages + f"{col}: {text}; ", messages)
+        return pd.DataFrame({"row": self.frame.index[positions], "errors": [m.rstrip("; ") for m in messages]})
+
+
+def missing_columns(df):
+    return [col for col in FEATURE_COLUMNS if col not in df.columns]
+
+
+def _factorized(series, parse):
+    # Text columns hold few distinct values, so only the uniques go through the slow string parsing
+    ids, uniques = pd.factorize(series, use_na_sentinel=True)
+    parsed = np.append(parse(pd.Index(uniques)), np.nan)
+    return parsed[ids]
+
+
+def _to_float(series):
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _parse_numbers(values):
+    return _to_float(pd.Series(pd.to_numeric(values, errors='coerce')))
+
+
+def coerce_numeric(series, column):
+    if series.dtype.kind in 'iuf':
+        values = _to_float(series)
+        reason = np.where(np.isnan(values), MISSING, OK).astype(np.int8)
+    else:
+        values = _factorized(series, _parse_numbers)
+        reason = np.where(np.isnan(values), np.where(series.isna().to_numpy(), MISSING, INVALID), OK).astype(np.int8)
+    reason[np.isinf(values)] = INVALID
+
+    low, high = NUMERIC_RANGES.get(column, (None, None))
+    outside = np.zeros(len(values), dtype=bool)
+    if low is not None:
+        outside |= values < low
+    if high is not None:
+        outside |= values > high
+    reason[outside & (reason == OK)] = OUT_OF_RANGE
+    return values, reason
+
+
+def coerce_category(series, column):
+    # Accepts the integer codes the models were trained on as well as their labels ("Ideal", "vs1")
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    lookup = _LABEL_LOOKUP[column]
+
+    def parse(uniques):
+        numbers = _parse_numbers(uniques)
+        labels = _to_float(pd.Series(uniques.astype(str).str.strip().str.upper().map(lookup)))
+        return np.where(np.isnan(numbers), labels, numbers)
+
+    values = _to_float(series) if series.dtype.kind in 'iuf' else _factorized(series, parse)
+    known = (values >= 0) & (values < len(lookup)) & (values == np.floor(values))
+    codes = np.where(known, values, INVALID_CODE).astype(np.int8)
+    reason = np.where(known, OK, np.where(series.isna().to_numpy(), MISSING, INVALID)).astype(np.int8)
+    return codes, reason
+
+
+def validate(df):
+    missing = missing_columns(df)
+    if missing:
+        raise ValueError(f"Отсутствуют необходимые колонки: {', '.join(missing)}")
+
+    columns, reasons = {}, {}
+    for col in FEATURE_COLUMNS:
+        if col in CATEGORICAL_COLUMNS:
+            columns[col], reasons[col] = coerce_category(df[col], col)
+        elif col in NUMERIC_COLUMNS:
+            columns[col], reasons[col] = coerce_numeric(df[col], col)
+    return ValidationResult(pd.DataFrame(columns, index=df.index, copy=False), reasons)
+
@@ -0,0 +1,160 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import model_registry
+import native_runtime
+import tracing
+from fast_preprocess import backend_dtype, compile_preprocessor
+from model_registry import FEATURE_COLUMNS
+
+# Tree libraries, TensorFlow and the NumPy-based native runtime release the GIL inside
+# predict, so threads sharing one model are enough. Pure sklearn estimators (Bagging,
+# PolynomialFeatures + Ridge) hold the GIL for most of the call and are scored in separate
+# processes instead.
+BACKEND_POOLS = {
+    "keras": "thread",
+    "xgboost": "thread",
+    "lightgbm": "thread",
+    "catboost": "thread",
+    "sklearn": "process",
+    "native": "thread"
+}
+
+# Below this size a shard is not worth the dispatch overhead
+MIN_SHARD_ROWS = 2048
+
+_worker_state = {}
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def prepare_model(model, backend):
+    # Each shard is already scored on its own core, so the library's own thread pool is
+    # limited to one thread to avoid oversubscription
+    if backend == "xgboost":
+        booster = model.get_booster().copy()
+        booster.set_param({"nthread": 1})
+        return booster
+    return model
+
+
+def predict_shard(model, backend, processed):
+    if backend == "xgboost":
+        predictions = model.inplace_predict(processed)
+    elif backend == "lightgbm":
+        predictions = model.predict(processed, num_threads=1)
+    elif backend == "catboost":
+        predictions = model.predict(processed, thread_count=1)
+    elif backend == "keras":
+        predictions = model.predict_on_batch(processed)
+    else:
+        predictions = model.predict(processed)
+    return np.asarray(predictions).reshape(-1)
+
+
+def _init_process_worker(model_filename):
+    backend = model_registry.get_backend(model_filename)
+    _worker_state['backend'] = backend
+    _worker_state['preprocessor'] = compile_preprocessor(model_registry.load_preprocessor(), backend_dtype(backend))
+    _worker_state['model'] = prepare_model(model_registry.load_model(model_filename), backend)
+
+
+def _score_in_process(frame):
+    processed = _worker_state['preprocessor'].transform(frame)
+    return predict_shard(_worker_state['model'], _worker_state['backend'], processed)
+
+
+class ScoringEngine:
+    def __init__(self, model_filename, workers=None, pool=None, model=None, preprocessor=None,
+                 min_shard_rows=MIN_SHARD_ROWS, native=False):
+        self.model_filename = model_filename
+        self.backend = "native" if native else model_registry.get_backend(model_filename)
+        self.pool = pool or BACKEND_POOLS.get(self.backend, "process")
+        if self.pool not in ("thread", "process"):
+            raise ValueError(f"Неизвестный тип пула: {self.pool}")
+        self.workers = max(1, workers if workers is not None else default_workers())
+        self.min_shard_rows = min_shard_rows
+        self._executor = None
+
+        # Process workers load their own copy; inline and thread scoring share one instance
+        self._preprocessor = preprocessor
+        self._model = model
+        self._shard_model = None
+
+    def _ensure_local_model(self):
+        if self.backend == "native" and (self._preprocessor is None or self._model is None):
+            self._preprocessor, self._model = native_runtime.load_native_model(self.model_filename)
+        if self._preprocessor is None:
+            self._preprocessor = model_registry.load_preprocessor()
+        self._preprocessor = compile_preprocessor(self._preprocessor, backend_dtype(self.backend))
+        if self._model is None:
+            self._model = model_registry.load_model(self.model_filename)
+
+    def _ensure_shard_model(self):
+        self._ensure_local_model()
+        if self._shard_model is None:
+            self._shard_model = prepare_model(self._model, self.backend)
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.pool == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_process_worker,
+                    initargs=(self.model_filename,)
+                )
+        return self._executor
+
+    def _score_inline(self, frame):
+        # A single shard keeps the library's own intra-op threading
+        with tracing.span("transform", self.model_filename, len(frame)):
+            processed = self._preprocessor.transform(frame)
+        with tracing.span("predict", self.model_filename, len(frame)):
+            return model_registry.predict(self._model, processed)
+
+    def _score_shard(self, frame):
+        with tracing.span("transform", self.model_filename, len(frame)):
+            processed = self._preprocessor.transform(frame)
+        with tracing.span("predict", self.model_filename, len(frame)):
+            return predict_shard(self._shard_model, self.backend, processed)
+
+    def shard_bounds(self, n_rows):
+        n_shards = min(self.workers, max(1, n_rows // self.min_shard_rows))
+        shard_size = math.ceil(n_rows / n_shards) if n_rows else 0
+        return [(start, min(start + shard_size, n_rows)) for start in range(0, n_rows, shard_size or 1)]
+
+    def predict(self, frame):
+        frame = frame[FEATURE_COLUMNS]
+        bounds = self.shard_bounds(len(frame))
+
+        if len(bounds) <= 1:
+            self._ensure_local_model()
+            return self._score_inline(frame)
+
+        shards = [frame.iloc[start:stop] for start, stop in bounds]
+        if self.pool == "thread":
+            self._ensure_shard_model()
+            return np.concatenate(list(self._get_executor().map(self._score_shard, shards)))
+        # Worker processes transform and predict out of reach of this tracer; the span covers both
+        with tracing.span("predict", self.model_filename, len(frame)):
+            return np.concatenate(list(self._get_executor().map(_score_in_process, shards)))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
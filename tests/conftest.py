@@ -0,0 +1,18 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from model_registry import FEATURE_COLUMNS  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def sample_rows():
+    df = pd.read_csv(os.path.join(ROOT, 'post_diamonds.csv'))[FEATURE_COLUMNS]
+    rng = np.random.default_rng(1)
+    return df.iloc[rng.choice(len(df), 2000, replace=False)].reset_index(drop=True)
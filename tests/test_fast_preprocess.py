@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import model_registry
+from fast_preprocess import CompiledPreprocessor
+from model_registry import FEATURE_COLUMNS
+
+# float32 output rounds the standardized numbers, float64 matches sklearn to rounding error
+PARITY_ATOL = {np.float32: 1e-5, np.float64: 1e-12}
+
+
+@pytest.fixture(scope="module")
+def preprocessor():
+    return model_registry.load_preprocessor()
+
+
+def as_dict(frame):
+    return {col: frame[col].to_numpy() for col in FEATURE_COLUMNS}
+
+
+@pytest.mark.parametrize("dtype", list(PARITY_ATOL))
+@pytest.mark.parametrize("convert", [lambda frame: frame, as_dict, lambda frame: frame.to_numpy()],
+                         ids=["DataFrame", "dict", "ndarray"])
+def test_transform_matches_sklearn(preprocessor, sample_rows, dtype, convert):
+    compiled = CompiledPreprocessor.from_sklearn(preprocessor, dtype=dtype)
+    result = compiled.transform(convert(sample_rows))
+    assert result.dtype == dtype
+    np.testing.assert_allclose(result, preprocessor.transform(sample_rows), rtol=0, atol=PARITY_ATOL[dtype])
+
+
+@pytest.mark.parametrize("dtype", list(PARITY_ATOL))
+def test_single_row(preprocessor, sample_rows, dtype):
+    compiled = CompiledPreprocessor.from_sklearn(preprocessor, dtype=dtype)
+    row = sample_rows.iloc[0].to_dict()
+    np.testing.assert_allclose(compiled.transform(row), preprocessor.transform(sample_rows.iloc[:1]),
+                               rtol=0, atol=PARITY_ATOL[dtype])
+
+
+@pytest.mark.parametrize("dtype", list(PARITY_ATOL))
+@pytest.mark.parametrize("code", [99, -1, 2.5])
+def test_unseen_category_is_all_zero(preprocessor, sample_rows, dtype, code):
+    compiled = CompiledPreprocessor.from_sklearn(preprocessor, dtype=dtype)
+    frame = sample_rows.iloc[:5].copy()
+    frame['cut'] = code
+    result = compiled.transform(frame)
+
+    index = compiled.categorical_columns.index('cut')
+    start = len(compiled.numeric_columns) + sum(len(cats) for cats in compiled.categories[:index])
+    assert not result[:, start:start + len(compiled.categories[index])].any()
+    np.testing.assert_allclose(result, preprocessor.transform(frame), rtol=0, atol=PARITY_ATOL[dtype])
@@ -0,0 +1,34 @@
+import pytest
+
+from inference_server import HttpError, content_length, validate_rows
+
+ROW = {"carat": 0.7, "cut": 0, "color": 3, "clarity": 3, "depth": 61.5, "table": 57, "x": 5.7, "y": 5.7, "z": 3.5}
+
+
+@pytest.mark.parametrize("value", ["abc", "-5", "1.5", ""])
+def test_content_length_rejects_malformed(value):
+    with pytest.raises(HttpError) as error:
+        content_length({"content-length": value})
+    assert error.value.status == 400
+
+
+def test_content_length_limits_body():
+    assert content_length({}) == 0
+    assert content_length({"content-length": "42"}) == 42
+    with pytest.raises(HttpError) as error:
+        content_length({"content-length": str(1 << 30)})
+    assert error.value.status == 413
+
+
+@pytest.mark.parametrize("changes", [{"carat": "abc"}, {"carat": None}, {"carat": True}, {"depth": False},
+                                     {"carat": [1]}, {"cut": "J"}])
+def test_validate_rows_rejects_bad_values(changes):
+    with pytest.raises(HttpError) as error:
+        validate_rows([{**ROW, **changes}])
+    assert error.value.status == 400
+
+
+def test_validate_rows_coerces_labels():
+    rows = validate_rows([ROW, {**ROW, "cut": "Premium", "color": "J", "clarity": "I1"}])
+    assert rows[1]["cut"] == 1 and rows[1]["color"] == 6 and rows[1]["clarity"] == 7
+    assert rows[0] == pytest.approx(ROW)
@@ -0,0 +1,65 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import model_registry
+import native_runtime
+from model_registry import PREPROCESSOR_FILE
+
+# Maximum allowed |native - original| relative to max(1, |original|); XGBoost and Keras
+# accumulate in float32, everything else matches to rounding error
+PARITY_RTOL = 1e-5
+
+if not os.path.exists(native_runtime.artifact_path()):
+    pytest.skip("нативный артефакт не собран, запустите native_export.py", allow_module_level=True)
+
+ARTIFACT = native_runtime.load_artifact()
+
+
+@pytest.fixture(scope="module")
+def preprocessor():
+    return model_registry.load_preprocessor()
+
+
+def test_preprocessor_parity(preprocessor, sample_rows):
+    expected = preprocessor.transform(sample_rows)
+    np.testing.assert_allclose(ARTIFACT.preprocessor.transform(sample_rows), expected, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("model_filename", sorted(ARTIFACT.models))
+def test_model_parity(model_filename, preprocessor, sample_rows):
+    native_preprocessor, native_model = native_runtime.load_native_model(model_filename)
+    expected = model_registry.predict(model_registry.load_model(model_filename), preprocessor.transform(sample_rows))
+    actual = native_model.predict(native_preprocessor.transform(sample_rows))
+    relative = np.abs(actual - expected) / np.maximum(1.0, np.abs(expected))
+    assert relative.max() <= PARITY_RTOL
+
+
+@pytest.fixture
+def models_copy(tmp_path, monkeypatch):
+    for filename in [PREPROCESSOR_FILE, *ARTIFACT.models]:
+        shutil.copy2(model_registry.model_path(filename), tmp_path / filename)
+    monkeypatch.setattr(native_runtime, "model_path", lambda filename: str(tmp_path / filename))
+    return tmp_path
+
+
+def test_check_sources_accepts_unchanged_files(models_copy):
+    for model_filename in ARTIFACT.models:
+        native_runtime.check_sources(ARTIFACT, model_filename)
+
+
+@pytest.mark.parametrize("changed", ["model", "preprocessor"])
+def test_check_sources_rejects_modified_file(models_copy, changed):
+    model_filename = sorted(ARTIFACT.models)[0]
+    with open(models_copy / (model_filename if changed == "model" else PREPROCESSOR_FILE), "ab") as f:
+        f.write(b"\0")
+    with pytest.raises(ValueError, match="устарел"):
+        native_runtime.check_sources(ARTIFACT, model_filename)
+
+
+def test_check_sources_skips_missing_sources(models_copy):
+    model_filename = sorted(ARTIFACT.models)[0]
+    os.remove(models_copy / model_filename)
+    native_runtime.check_sources(ARTIFACT, model_filename)
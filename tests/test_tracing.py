@@ -0,0 +1,16 @@
+from tracing import Tracer
+
+
+def test_request_uses_its_own_label(tmp_path):
+    tracer = Tracer(profile_dir=str(tmp_path))
+    with tracer.request("form_predict"):
+        with tracer.span("predict", "xgboost.pkl", 1):
+            pass
+
+    stages = {(item['stage'], item['model'], item['request']): item for item in tracer.snapshot()['stages']}
+    assert set(stages) == {("request", "", "form_predict"), ("predict", "xgboost.pkl", "")}
+    assert stages[("predict", "xgboost.pkl", "")]['rows'] == 1
+
+    text = tracer.to_prometheus()
+    assert 'stage="request",model="",request="form_predict",le="+Inf"} 1' in text
+    assert 'diamonds_stage_rows_total{stage="predict",model="xgboost.pkl",request=""} 1' in text
@@ -0,0 +1,244 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.path.join(ROOT_DIR, '.cache', 'profiles')
+
+TRACING_ENV = 'DIAMONDS_TRACING'
+METRICS_FILE_ENV = 'DIAMONDS_METRICS_FILE'
+PROFILE_SLOW_MS_ENV = 'DIAMONDS_PROFILE_SLOW_MS'
+
+# Upper bucket bounds in seconds, roughly 2.5x apart from 100 us to 30 s; the last bucket is +Inf
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.rows = 0
+        self.max = 0.0
+
+    def observe(self, seconds, rows=None):
+        index = 0
+        while index < len(self.buckets) and seconds > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        if rows:
+            self.rows += rows
+
+    def quantile(self, q):
+        # Linear interpolation inside the bucket that holds the q-th observation
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= target:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return lower + (upper - lower) * (target - seen) / count
+            seen += count
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum_seconds": self.sum,
+            "max_seconds": self.max,
+            "rows": self.rows,
+            "p50_seconds": self.quantile(0.5),
+            "p95_seconds": self.quantile(0.95),
+            "buckets": {("+Inf" if i == len(self.buckets) else repr(self.buckets[i])): count
+                        for i, count in enumerate(self.counts)},
+        }
+
+
+class _NoopSpan:
+    # Shared by every disabled span: entering and leaving it does no work at all
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "stage", "model", "rows", "start")
+
+    def __init__(self, tracer, stage, model, rows):
+        self.tracer = tracer
+        self.stage = stage
+        self.model = model
+        self.rows = rows
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.record(self.stage, time.perf_counter() - self.start, self.rows, self.model,
+                           error=exc_type is not None)
+        return False
+
+
+class Request:
+    # Times a whole user action and, when asked to, profiles it with cProfile. In slow-request mode
+    # every request is profiled but only one that exceeds the threshold is kept.
+    def __init__(self, tracer, name, profile):
+        self.tracer = tracer
+        self.name = name
+        self.profile = profile
+        self.profiler = None
+        self.seconds = None
+        self.profile_path = None
+        self.profile_summary = None
+
+    def __enter__(self):
+        if self.profile or (self.tracer.enabled and self.tracer.profile_armed()):
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        if self.profiler is not None:
+            self.profiler.disable()
+            if self.profile or self.tracer.claim_slow_profile(self.seconds):
+                self.profile_path, self.profile_summary = self.tracer.save_profile(self.name, self.profiler)
+        if self.tracer.enabled:
+            # The action name goes into its own label: `model` only ever holds model filenames
+            self.tracer.record("request", self.seconds, error=exc_type is not None, request=self.name)
+            self.tracer.flush()
+        return False
+
+
+class Tracer:
+    def __init__(self, enabled=True, metrics_file=None, profile_slow_seconds=None, profile_dir=PROFILE_DIR):
+        self.enabled = enabled
+        self.metrics_file = metrics_file
+        self.profile_slow_seconds = profile_slow_seconds
+        self.profile_dir = profile_dir
+        self.slow_profiles_left = 1 if profile_slow_seconds is not None else 0
+        self._histograms = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    @classmethod
+    def from_env(cls):
+        slow_ms = os.environ.get(PROFILE_SLOW_MS_ENV)
+        return cls(enabled=os.environ.get(TRACING_ENV, "1") != "0",
+                   metrics_file=os.environ.get(METRICS_FILE_ENV) or None,
+                   profile_slow_seconds=float(slow_ms) / 1000 if slow_ms else None)
+
+    def span(self, stage, model=None, rows=None):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, stage, model, rows)
+
+    def request(self, name, profile=False):
+        return Request(self, name, profile)
+
+    def record(self, stage, seconds, rows=None, model=None, error=False, request=None):
+        key = (stage, model or "", request or "")
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds, rows)
+            if error:
+                self._errors[key] = self._errors.get(key, 0) + 1
+
+    def profile_armed(self):
+        return self.slow_profiles_left > 0
+
+    def claim_slow_profile(self, seconds):
+        with self._lock:
+            if self.slow_profiles_left > 0 and seconds >= self.profile_slow_seconds:
+                self.slow_profiles_left -= 1
+                return True
+        return False
+
+    def save_profile(self, name, profiler, limit=25):
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+        summary = stream.getvalue()
+        path = None
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{name}-{datetime.now():%Y%m%d-%H%M%S-%f}.prof")
+            profiler.dump_stats(path)
+        except OSError:
+            pass
+        return path, summary
+
+    def snapshot(self):
+        with self._lock:
+            stages = [
+                {"stage": stage, "model": model, "request": request, **histogram.to_dict(),
+                 "errors": self._errors.get((stage, model, request), 0)}
+                for (stage, model, request), histogram in sorted(self._histograms.items())
+            ]
+        return {"started_at": self.started_at, "written_at": time.time(), "stages": stages}
+
+    def flush(self):
+        if self.metrics_file:
+            write_metrics(self.metrics_file, self.snapshot())
+
+    def to_prometheus(self, prefix="diamonds_stage"):
+        lines = [f"# TYPE {prefix}_seconds histogram"]
+        with self._lock:
+            items = sorted(self._histograms.items())
+            for (stage, model, request), histogram in items:
+                labels = f'stage="{stage}",model="{model}",request="{request}"'
+                cumulative = 0
+                for index, count in enumerate(histogram.counts):
+                    cumulative += count
+                    bound = "+Inf" if index == len(histogram.buckets) else repr(histogram.buckets[index])
+                    lines.append(f'{prefix}_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{prefix}_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{prefix}_seconds_count{{{labels}}} {histogram.count}")
+            lines.append(f"# TYPE {prefix}_rows_total counter")
+            for (stage, model, request), histogram in items:
+                labels = f'stage="{stage}",model="{model}",request="{request}"'
+                lines.append(f"{prefix}_rows_total{{{labels}}} {histogram.rows}")
+        return "\n".join(lines) + "\n"
+
+
+def write_metrics(path, snapshot):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+tracer = Tracer.from_env()
+
+
+def span(stage, model=None, rows=None):
+    return tracer.span(stage, model, rows)
+
+
+def request(name, profile=False):
+    return tracer.request(name, profile)
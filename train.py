@@ -0,0 +1,423 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import numpy as np
+
+import dataset
+import explain
+import model_registry
+from dataset import CATEGORICAL_COLUMNS, NUMERIC_COLUMNS, TARGET_COLUMN
+from fast_preprocess import backend_dtype
+from model_registry import FEATURE_COLUMNS, MANIFEST_FILE, MODELS_DIR, PREPROCESSOR_FILE
+
+VERSIONS_DIR = os.path.join(MODELS_DIR, 'versions')
+
+# Every list is a grid axis; the search trains the full cartesian product of each model's grid.
+# Boosting iteration counts and MLP epochs are upper bounds, early stopping on the validation
+# split picks the actual number.
+CONFIGS = {
+    "full": {
+        "sample_rows": None,
+        "test_size": 0.2,
+        "val_size": 0.1,
+        "seed": 42,
+        "early_stopping_rounds": 50,
+        "search": {
+            "xgboost.pkl": {"n_estimators": [3000], "learning_rate": [0.03, 0.1], "max_depth": [6, 8],
+                            "subsample": [0.8], "colsample_bytree": [0.8]},
+            "lightgbm.pkl": {"n_estimators": [3000], "learning_rate": [0.03, 0.1], "num_leaves": [31, 127]},
+            "catboost.pkl": {"iterations": [3000], "learning_rate": [0.05, 0.1], "depth": [6, 8]},
+            "baggingregressor.pkl": {"n_estimators": [200], "max_samples": [0.5, 1.0], "step": [10]},
+            "polinomialreg.pkl": {"degree": [2], "alpha": [0.1, 1.0, 10.0]},
+            "mlp.h5": {"epochs": [300], "batch_size": [256], "learning_rate": [1e-3, 3e-4], "dropout": [0.1, 0.2]},
+        },
+    },
+    # Deterministic CPU-only run on a small sample, one candidate per model
+    "smoke": {
+        "sample_rows": 4000,
+        "test_size": 0.2,
+        "val_size": 0.1,
+        "seed": 0,
+        "early_stopping_rounds": 10,
+        "search": {
+            "xgboost.pkl": {"n_estimators": [100], "learning_rate": [0.1], "max_depth": [4],
+                            "subsample": [1.0], "colsample_bytree": [1.0]},
+            "lightgbm.pkl": {"n_estimators": [100], "learning_rate": [0.1], "num_leaves": [15]},
+            "catboost.pkl": {"iterations": [100], "learning_rate": [0.1], "depth": [4]},
+            "baggingregressor.pkl": {"n_estimators": [20], "max_samples": [1.0], "step": [10]},
+            "polinomialreg.pkl": {"degree": [2], "alpha": [1.0]},
+            "mlp.h5": {"epochs": [5], "batch_size": [256], "learning_rate": [1e-3], "dropout": [0.1]},
+        },
+    },
+}
+
+# Slow searches are submitted first so the pool is not left waiting on one long trial at the end
+TRAINING_ORDER = ["mlp.h5", "catboost.pkl", "baggingregressor.pkl", "xgboost.pkl", "lightgbm.pkl",
+                  "polinomialreg.pkl"]
+
+_worker_state = {}
+
+
+def build_preprocessor():
+    from sklearn.compose import ColumnTransformer
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    return ColumnTransformer([
+        ('num', StandardScaler(), NUMERIC_COLUMNS),
+        ('cat', OneHotEncoder(handle_unknown='ignore'), CATEGORICAL_COLUMNS)
+    ])
+
+
+def split_indices(n_rows, config):
+    rng = np.random.default_rng(config["seed"])
+    order = rng.permutation(n_rows)
+    if config["sample_rows"] is not None:
+        order = order[:config["sample_rows"]]
+    n_test = int(len(order) * config["test_size"])
+    n_val = int(len(order) * config["val_size"])
+    return order[n_val + n_test:], order[:n_val], order[n_val:n_val + n_test]
+
+
+def grid(space):
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def regression_metrics(y_true, y_pred):
+    error = y_pred - y_true
+    total = np.sum((y_true - y_true.mean()) ** 2)
+    return {
+        "rmse": float(np.sqrt(np.mean(error ** 2))),
+        "mae": float(np.mean(np.abs(error))),
+        "r2": float(1.0 - np.sum(error ** 2) / total) if total > 0 else float("nan"),
+    }
+
+
+def fit_xgboost(params, data, seed, threads, early_stopping_rounds):
+    import xgboost
+
+    model = xgboost.XGBRegressor(**params, random_state=seed, n_jobs=threads, tree_method="hist",
+                                 device="cpu", early_stopping_rounds=early_stopping_rounds)
+    model.fit(data["X_train"], data["y_train"], eval_set=[(data["X_val"], data["y_val"])], verbose=False)
+    return model, model.best_iteration + 1
+
+
+def fit_lightgbm(params, data, seed, threads, early_stopping_rounds):
+    import lightgbm
+
+    model = lightgbm.LGBMRegressor(**params, random_state=seed, n_jobs=threads, deterministic=True,
+                                   force_row_wise=True, verbose=-1)
+    model.fit(data["X_train"], data["y_train"], eval_set=[(data["X_val"], data["y_val"])],
+              callbacks=[lightgbm.early_stopping(early_stopping_rounds, verbose=False)])
+    return model, model.best_iteration_
+
+
+def fit_catboost(params, data, seed, threads, early_stopping_rounds):
+    import catboost
+
+    model = catboost.CatBoostRegressor(**params, random_seed=seed, thread_count=threads, task_type="CPU",
+                                       early_stopping_rounds=early_stopping_rounds, use_best_model=True,
+                                       allow_writing_files=False, verbose=False)
+    model.fit(data["X_train"], data["y_train"], eval_set=(data["X_val"], data["y_val"]))
+    return model, model.get_best_iteration() + 1
+
+
+def fit_bagging(params, data, seed, threads, early_stopping_rounds):
+    from sklearn.ensemble import BaggingRegressor
+    from sklearn.tree import DecisionTreeRegressor
+
+    # Bagging has no built-in early stopping: grow the ensemble in steps with warm_start and stop
+    # once two consecutive steps no longer improve the validation error
+    step = params["step"]
+    model = BaggingRegressor(DecisionTreeRegressor(), n_estimators=0, max_samples=params["max_samples"],
+                             warm_start=True, random_state=seed, n_jobs=threads)
+    best_rmse, best_estimators, stale = float("inf"), 0, 0
+    while model.n_estimators < params["n_estimators"] and stale < 2:
+        model.n_estimators = min(model.n_estimators + step, params["n_estimators"])
+        model.fit(data["X_train"], data["y_train"])
+        rmse = regression_metrics(data["y_val"], model.predict(data["X_val"]))["rmse"]
+        if rmse < best_rmse:
+            best_rmse, best_estimators, stale = rmse, model.n_estimators, 0
+        else:
+            stale += 1
+    model.estimators_ = model.estimators_[:best_estimators]
+    model.estimators_features_ = model.estimators_features_[:best_estimators]
+    model.n_estimators = best_estimators
+    return model, best_estimators
+
+
+def fit_polynomial(params, data, seed, threads, early_stopping_rounds):
+    from sklearn.linear_model import Ridge
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import PolynomialFeatures
+
+    model = Pipeline([
+        ('poly_features', PolynomialFeatures(degree=params["degree"], include_bias=False)),
+        ('lin_reg', Ridge(alpha=params["alpha"]))
+    ])
+    model.fit(data["X_train"], data["y_train"])
+    return model, None
+
+
+def fit_mlp(params, data, seed, threads, early_stopping_rounds):
+    tf = model_registry.import_backend("keras")
+    tf.keras.utils.set_random_seed(seed)
+    tf.config.experimental.enable_op_determinism()
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    layers = tf.keras.layers
+    model = tf.keras.Sequential([
+        layers.Input(shape=(data["X_train"].shape[1],)),
+        layers.Dense(128, activation='relu'),
+        layers.BatchNormalization(),
+        layers.Dropout(params["dropout"]),
+        layers.Dense(64, activation='relu'),
+        layers.BatchNormalization(),
+        layers.Dropout(params["dropout"]),
+        layers.Dense(32, activation='relu'),
+        layers.Dense(1)
+    ])
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=params["learning_rate"]), loss='mse')
+    stopper = tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=early_stopping_rounds,
+                                               restore_best_weights=True)
+    history = model.fit(data["X_train"], data["y_train"], validation_data=(data["X_val"], data["y_val"]),
+                        epochs=params["epochs"], batch_size=params["batch_size"], shuffle=True,
+                        callbacks=[stopper], verbose=0)
+    best_epoch = int(np.argmin(history.history['val_loss'])) + 1
+    return model, best_epoch
+
+
+TRAINERS = {
+    "xgboost.pkl": fit_xgboost,
+    "lightgbm.pkl": fit_lightgbm,
+    "catboost.pkl": fit_catboost,
+    "baggingregressor.pkl": fit_bagging,
+    "polinomialreg.pkl": fit_polynomial,
+    "mlp.h5": fit_mlp,
+}
+
+
+def save_model(model, path):
+    if path.endswith('.h5'):
+        model.save(path)
+    else:
+        import joblib
+        joblib.dump(model, path)
+
+
+def _init_worker(data, threads):
+    # Keep TensorFlow off any GPU so that runs are reproducible on every machine
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    _worker_state['data'] = data
+    _worker_state['threads'] = threads
+
+
+def _trial_data(model_filename):
+    # Each model is fitted and scored on the same dtype it gets when served (float64 for sklearn);
+    # the cast is done once per dtype and worker
+    dtype = backend_dtype(model_registry.get_backend(model_filename))
+    cache = _worker_state.setdefault('by_dtype', {})
+    if dtype not in cache:
+        data = _worker_state['data']
+        cache[dtype] = {key: values.astype(dtype, copy=False) if key.startswith("X_") else values
+                        for key, values in data.items()}
+    return cache[dtype]
+
+
+def run_trial(model_filename, params, config, trial_path):
+    data = _trial_data(model_filename)
+    start = time.perf_counter()
+    model, best_iteration = TRAINERS[model_filename](params, data, config["seed"], _worker_state['threads'],
+                                                     config["early_stopping_rounds"])
+    training_seconds = time.perf_counter() - start
+
+    val = regression_metrics(data["y_val"], model_registry.predict(model, data["X_val"]))
+    test = regression_metrics(data["y_test"], model_registry.predict(model, data["X_test"]))
+    # Conformal interval calibrated on the validation split, its actual coverage checked on the test split
+    interval = explain.calibrate(model, data["X_val"], data["y_val"])
+    low, high = explain.prediction_interval(model, data["X_test"], interval)
+    interval.update(source="validation",
+                    test_coverage=float(np.mean((data["y_test"] >= low) & (data["y_test"] <= high))))
+    save_model(model, trial_path)
+    return {
+        "params": params,
+        "best_iteration": best_iteration,
+        "training_seconds": training_seconds,
+        "metrics": {"val_rmse": val["rmse"], "test_rmse": test["rmse"], "test_mae": test["mae"],
+                    "test_r2": test["r2"]},
+        "interval": interval,
+        "path": trial_path,
+    }
+
+
+def train(config_name="full", data_path=dataset.DATASET_PATH, output_dir=VERSIONS_DIR, model_filenames=None,
+          workers=None, progress=None, models_dir=MODELS_DIR):
+    import joblib
+
+    config = CONFIGS[config_name]
+    model_filenames = [name for name in TRAINING_ORDER if model_filenames is None or name in model_filenames]
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    diamonds = dataset.load_dataset(data_path)
+    frame = diamonds.to_frame(decode=False)
+    train_rows, val_rows, test_rows = split_indices(len(frame), config)
+
+    # A run over some of the models keeps the promoted preprocessor: the remaining models were trained on its scaling
+    promoted_preprocessor = os.path.join(models_dir, PREPROCESSOR_FILE)
+    reuse_preprocessor = set(model_filenames) != set(TRAINERS) and os.path.exists(promoted_preprocessor)
+    if reuse_preprocessor:
+        preprocessor = joblib.load(promoted_preprocessor)
+    else:
+        preprocessor = build_preprocessor()
+        preprocessor.fit(frame.iloc[train_rows][FEATURE_COLUMNS])
+    target = frame[TARGET_COLUMN].to_numpy(dtype=np.float64)
+    data = {}
+    for split, rows in (("train", train_rows), ("val", val_rows), ("test", test_rows)):
+        data[f"X_{split}"] = np.asarray(preprocessor.transform(frame.iloc[rows][FEATURE_COLUMNS]), dtype=np.float64)
+        data[f"y_{split}"] = target[rows]
+
+    created = datetime.now(timezone.utc)
+    version = f"{created:%Y%m%d-%H%M%S}-{diamonds.digest[:8]}"
+    version_dir = os.path.join(output_dir, version)
+    trials_dir = os.path.join(version_dir, 'trials')
+    os.makedirs(trials_dir, exist_ok=True)
+    joblib.dump(preprocessor, os.path.join(version_dir, PREPROCESSOR_FILE))
+
+    tasks = []
+    for model_filename in model_filenames:
+        stem, ext = os.path.splitext(model_filename)
+        for i, params in enumerate(grid(config["search"][model_filename])):
+            tasks.append((model_filename, params, os.path.join(trials_dir, f"{stem}-{i}{ext}")))
+
+    # Threads are split between workers so that parallel trials do not oversubscribe the CPU
+    workers = min(workers, len(tasks))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    trials = {name: [] for name in model_filenames}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(data, threads)) as executor:
+        futures = {executor.submit(run_trial, name, params, config, path): name for name, params, path in tasks}
+        for future in as_completed(futures):
+            trial = future.result()
+            trials[futures[future]].append(trial)
+            if progress is not None:
+                progress(futures[future], trial)
+
+    models = {}
+    for model_filename, results in trials.items():
+        best = min(results, key=lambda trial: trial["metrics"]["val_rmse"])
+        os.replace(best["path"], os.path.join(version_dir, model_filename))
+        models[model_filename] = {
+            "version": version,
+            "params": best["params"],
+            "best_iteration": best["best_iteration"],
+            "metrics": best["metrics"],
+            "interval": best["interval"],
+            "training_seconds": best["training_seconds"],
+            "trials": len(results),
+            "search_seconds": sum(trial["training_seconds"] for trial in results),
+        }
+    shutil.rmtree(trials_dir)
+
+    manifest = {
+        "version": version,
+        "created_at": created.isoformat(timespec="seconds"),
+        "config": config_name,
+        "seed": config["seed"],
+        "data": {
+            "file": os.path.basename(data_path),
+            "sha256": diamonds.digest,
+            "rows": len(diamonds),
+            "train_rows": len(train_rows),
+            "val_rows": len(val_rows),
+            "test_rows": len(test_rows),
+        },
+        "preprocessor": PREPROCESSOR_FILE,
+        "preprocessor_reused": reuse_preprocessor,
+        "partial": set(model_filenames) != set(TRAINERS),
+        "models": models,
+        "workers": workers,
+        "training_seconds": time.perf_counter() - started,
+        "libraries": model_registry.library_versions(),
+    }
+    with open(os.path.join(version_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return version_dir, manifest
+
+
+def _replace_file(target, write):
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, target)
+
+
+def promote(version_dir, models_dir=MODELS_DIR):
+    # Files are copied under a temporary name and renamed, so a running app never reads a half-written
+    # model; the manifest goes last and marks the switch as complete
+    with open(os.path.join(version_dir, MANIFEST_FILE), encoding="utf-8") as f:
+        manifest = json.load(f)
+    filenames = list(manifest["models"])
+    if not manifest.get("preprocessor_reused"):
+        filenames.insert(0, manifest["preprocessor"])
+    for filename in filenames:
+        _replace_file(os.path.join(models_dir, filename),
+                      lambda tmp_path: shutil.copy2(os.path.join(version_dir, filename), tmp_path))
+
+    # A partial run only replaces its own entries; the other models keep their metrics and calibration
+    manifest_path = os.path.join(models_dir, MANIFEST_FILE)
+    if manifest.get("partial") and os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            previous = json.load(f)
+        kept = {name: {"version": previous["version"], **info} for name, info in previous["models"].items()}
+        manifest = {**manifest, "models": {**kept, **manifest["models"]}}
+
+    def write_manifest(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    _replace_file(manifest_path, write_manifest)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обучение препроцессора и моделей с параллельным подбором гиперпараметров")
+    parser.add_argument("--config", choices=sorted(CONFIGS), default="full")
+    parser.add_argument("--data", default=dataset.DATASET_PATH, help="CSV с данными (по умолчанию post_diamonds.csv)")
+    parser.add_argument("--models", nargs="*", choices=list(TRAINERS), help="Обучить только указанные модели")
+    parser.add_argument("--workers", type=int, default=None, help="Число процессов (по умолчанию число ядер)")
+    parser.add_argument("--output-dir", default=VERSIONS_DIR)
+    parser.add_argument("--promote", action="store_true",
+                        help="Скопировать обученные артефакты в models/ для приложения")
+    args = parser.parse_args(argv)
+
+    def report(model_filename, trial):
+        metrics = trial["metrics"]
+        print(f"{model_filename:<22} {json.dumps(trial['params'])} val RMSE {metrics['val_rmse']:.1f} "
+              f"({trial['training_seconds']:.1f} с)")
+
+    version_dir, manifest = train(args.config, args.data, args.output_dir, args.models, args.workers, report)
+    print(f"\nВерсия {manifest['version']} сохранена в {version_dir} за {manifest['training_seconds']:.1f} с")
+    for model_filename, info in manifest["models"].items():
+        metrics = info["metrics"]
+        print(f"{model_filename:<22} test RMSE {metrics['test_rmse']:.1f}  MAE {metrics['test_mae']:.1f}  "
+              f"R2 {metrics['test_r2']:.4f}  покрытие {info['interval']['coverage']:.0%}-интервала "
+              f"{info['interval']['test_coverage']:.1%}")
+
+    if args.promote:
+        promote(version_dir)
+        print(f"Артефакты скопированы в {MODELS_DIR}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())